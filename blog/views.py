@@ -8,6 +8,9 @@ from django.utils.text import get_valid_filename
 import uuid
 from django.http import HttpResponseBadRequest
 from django.conf import settings
+from django.db.models import Max, Q
+
+from ochre.conditional import conditional_page
 
 
 # ============================================================
@@ -98,6 +101,18 @@ def blog_list_more(request):
 # BLOG DETAIL PAGE
 # ============================================================
 
+def _blog_stamp(request, slug):
+    # the sidebar lists recent posts, so any published post moves the page on
+    stamp = BlogPost.objects.filter(published=True).aggregate(
+        post=Max("updated_at", filter=Q(slug=slug)),
+        latest=Max("updated_at"),
+    )
+    if stamp["post"] is None:
+        return None
+    return (f"blog.post:{slug}", stamp["latest"])
+
+
+@conditional_page(_blog_stamp)
 def blog_detail(request, slug):
     """
     Individual blog detail page.
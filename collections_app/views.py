@@ -1,4 +1,6 @@
 from django.shortcuts import render, get_object_or_404
+
+from ochre.conditional import conditional_page
 from .models import CollectionItem, CATEGORY_CHOICES
 
 from .models import CollectionItem
@@ -41,6 +43,12 @@ def collections_index(request):
 # COLLECTION ITEM DETAIL PAGE
 # -----------------------------------------------------------------------------
 
+def _collectionitem_stamp(request, pk):
+    updated_at = CollectionItem.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+    return (f"collections.item:{pk}", updated_at) if updated_at else None
+
+
+@conditional_page(_collectionitem_stamp)
 def collectionitem_detail(request, pk):
     item = get_object_or_404(CollectionItem, pk=pk)
     return render(request, "collections/collectionitem_detail.html", {"item": item})
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediahub', '0002_presskit_remove_pressarticle_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pressarticle',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -20,6 +20,8 @@ class PressArticle(models.Model):
     # Full article content for detail page
     content = models.TextField(blank=True)
 
+    updated_at = models.DateTimeField(auto_now=True)
+
     class Meta:
         ordering = ["-date"]  # Reverse chronological
 
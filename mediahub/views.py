@@ -1,4 +1,6 @@
 from django.shortcuts import render, get_object_or_404
+
+from ochre.conditional import conditional_page
 from .models import PressArticle, PressKit
 
 
@@ -16,6 +18,12 @@ def media_index(request):
     return render(request, "mediahub/media_list.html", context)
 
 
+def _press_stamp(request, slug):
+    row = PressArticle.objects.filter(slug=slug).values_list("pk", "updated_at").first()
+    return (f"mediahub.press:{row[0]}", row[1]) if row else None
+
+
+@conditional_page(_press_stamp)
 def press_detail(request, slug):
     article = get_object_or_404(PressArticle, slug=slug)
     context = {"article": article}
@@ -0,0 +1,70 @@
+# ochre/conditional.py
+"""
+Conditional GET (ETag / Last-Modified) for public detail pages.
+
+A view decorated with `conditional_page(stamp)` answers a matching
+If-None-Match / If-Modified-Since with a 304 before the view runs, so
+repeat visits and crawlers skip the template render entirely.
+
+`stamp(request, **view_kwargs)` returns (key, last_modified) for the
+rows the page is built from, or None to let the view handle it (e.g. a
+404). It should be a single cheap query.
+
+Pages also carry per-visitor bits (cart badge, flash messages, CSRF
+token), so:
+  * visitors with a session, a guest cart cookie or pending messages
+    always get a full render - their page is not a function of the rows
+    alone;
+  * the CSRF cookie is folded into the ETag, so a cached copy is only
+    revalidated for the browser whose token it contains.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+
+
+def _has_visitor_state(request):
+    return (
+        settings.SESSION_COOKIE_NAME in request.COOKIES
+        or "messages" in request.COOKIES
+        or getattr(settings, "SHOP_CART_COOKIE_NAME", None) in request.COOKIES
+    )
+
+
+def conditional_page(stamp):
+    def decorator(view):
+        def _stamp(request, **kwargs):
+            if not hasattr(request, "_conditional_stamp"):
+                request._conditional_stamp = stamp(request, **kwargs)
+            return request._conditional_stamp
+
+        def etag(request, *args, **kwargs):
+            result = _stamp(request, **kwargs)
+            if result is None:
+                return None
+            key, last_modified = result
+            csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")
+            raw = f"{key}:{last_modified.timestamp()}:{csrf}"
+            return hashlib.md5(raw.encode()).hexdigest()
+
+        def last_modified(request, *args, **kwargs):
+            result = _stamp(request, **kwargs)
+            return result[1] if result else None
+
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _has_visitor_state(request):
+                response = view(request, *args, **kwargs)
+            else:
+                response = conditional_view(request, *args, **kwargs)
+            patch_vary_headers(response, ("Cookie",))
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,58 @@
+# ochre/pagination.py
+"""
+Admin changelist paginator that doesn't COUNT(*) big tables.
+
+An unfiltered changelist only needs a page count, so on large PostgreSQL
+tables the row total comes from pg_class.reltuples instead of a full
+scan. Filtered querysets, small tables and other backends use the exact
+count (SQLite has no estimate: MAX(rowid) overcounts badly once rows are
+deleted). If the estimate still runs past the real rows - it lags until
+the next ANALYZE - a page that comes back empty switches the paginator
+to the exact count. Pair it with `show_full_result_count = False` on the
+ModelAdmin.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# below this an exact COUNT is cheap enough and nicer to look at
+EXACT_COUNT_LIMIT = 10000
+
+
+def estimated_count(queryset):
+    """Row estimate for the queryset's whole table, or None if unavailable."""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        else:
+            return None
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    estimated = False
+    exact = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not self.exact and hasattr(queryset, "query") and not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def page(self, number):
+        page = super().page(number)
+        if self.estimated and page.number > 1 and not page.object_list.exists():
+            # the estimate ran past the real rows: count them and re-check
+            # the page number (EmptyPage if it really is past the end)
+            self.estimated, self.exact = False, True
+            for name in ("count", "num_pages", "page_range"):
+                self.__dict__.pop(name, None)
+            page = super().page(number)
+        return page
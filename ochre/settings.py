@@ -32,6 +32,9 @@ INSTALLED_APPS = [
     "allauth.account",
     "allauth.socialaccount",
 
+    # REST API (read-only catalogue)
+    "rest_framework",
+
     # CKEditor 5 (rich text for blog admin)
     "django_ckeditor_5",
 
@@ -64,6 +67,8 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
 
     "allauth.account.middleware.AccountMiddleware",
+
+    "shop.middleware.AnonCartCookieMiddleware",
 ]
 
 
@@ -232,3 +237,34 @@ LOGOUT_REDIRECT_URL = "/"
 # ============================================================
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# ============================================================
+# SHOP
+# ============================================================
+
+# Also generate AVIF product image derivatives (needs an AVIF-capable
+# pillow_heif build; WebP is always generated).
+SHOP_IMAGE_AVIF = False
+
+# Where guest carts live: "session" (DB-backed session, the default) or
+# "cookie" (a compact signed cookie - no session write per add/remove).
+SHOP_ANON_CART_STORAGE = "session"
+SHOP_CART_COOKIE_NAME = "ochre_cart"
+SHOP_CART_COOKIE_AGE = 60 * 60 * 24 * 30
+
+# How long checkout holds a cart's tracked stock; release_stock_reservations
+# returns expired holds.
+SHOP_RESERVATION_MINUTES = 15
+
+# Cache alias for the header's cart badge counts. Only used when it is
+# shared by all workers (Redis, Memcached, database, file); with the
+# per-process LocMem default the count is read from the cart each time.
+SHOP_CART_COUNT_CACHE = "default"
+
+# How long idempotency keys (and the responses replayed for them) are kept
+# for the place-order and booking endpoints; sweep_carts purges older ones.
+SHOP_IDEMPOTENCY_KEY_HOURS = 24
+# A key whose request never finished (worker killed mid-request) blocks
+# retries with 409 for this long, then the next retry takes it over.
+SHOP_IDEMPOTENCY_LEASE_SECONDS = 120
@@ -25,6 +25,9 @@ urlpatterns = [
     path("contact/", include("contact.urls", namespace="contact")),
     path("shop/", include("shop.urls", namespace="shop")),
 
+    # APIs
+    path("api/shop/", include("shop.api_urls")),
+
     # CKEditor5    
     path("ckeditor5/", include("django_ckeditor_5.urls")),
 
@@ -1,4 +1,17 @@
-from django.contrib import admin
+from decimal import Decimal
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Round
+
+from ochre.pagination import EstimatedCountPaginator
+from .inventory import adjust_stock
+from .search import filter_matching
+from .repricing import prices_changed
+from .signals import catalog_changed
 from .models import (
     ShopCategory,
     ShopItem,
@@ -8,12 +21,32 @@ from .models import (
     ProductUnit,
     Cart,
     CartItem,
+    StockReservation,
     ExperienceBooking,
     Order,
     OrderItem,
+    IdempotencyKey,
 )
 
 
+ACTION_CHUNK_SIZE = 500
+
+
+def _chunked_pks(queryset, size=ACTION_CHUNK_SIZE):
+    pks = list(queryset.order_by().values_list("pk", flat=True))
+    for start in range(0, len(pks), size):
+        yield pks[start:start + size]
+
+
+class RepriceActionForm(ActionForm):
+    percent = forms.DecimalField(
+        required=False,
+        max_digits=6,
+        decimal_places=2,
+        help_text="For “Reprice”: e.g. 10 for +10%, -5 for −5%.",
+    )
+
+
 @admin.register(ShopCategory)
 class ShopCategoryAdmin(admin.ModelAdmin):
     list_display = ("name", "slug")
@@ -21,8 +54,38 @@ class ShopCategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("name",)}
 
 
+class ProductUnitInlineForm(forms.ModelForm):
+    """
+    Stock is never written back from the form: checkouts decrement it
+    concurrently, so the admin enters a change that is applied with F().
+    """
+    stock_change = forms.IntegerField(
+        required=False,
+        label="Stock +/−",
+        help_text="Units to add (negative to remove). Starts tracking an untracked unit.",
+    )
+
+    class Meta:
+        model = ProductUnit
+        fields = ("unit_type", "label", "value", "price", "is_default", "is_active")
+
+    def save(self, commit=True):
+        unit = super().save(commit=False)
+        if commit:
+            if unit.pk:
+                unit.save(update_fields=[
+                    f.name for f in ProductUnit._meta.concrete_fields
+                    if f.name in self.fields and not f.primary_key
+                ])
+            else:
+                unit.save()
+            adjust_stock(unit.pk, self.cleaned_data.get("stock_change"))
+        return unit
+
+
 class ProductUnitInline(admin.TabularInline):
     model = ProductUnit
+    form = ProductUnitInlineForm
     extra = 1
     fields = (
         "unit_type",
@@ -31,7 +94,22 @@ class ProductUnitInline(admin.TabularInline):
         "price",
         "is_default",
         "is_active",
+        "stock",
+        "stock_change",
     )
+    readonly_fields = ("stock",)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == "unit_type":
+            # one UnitType query per page, not one per inline row
+            if not hasattr(request, "_shop_unit_type_choices"):
+                request._shop_unit_type_choices = list(formfield.choices)
+            formfield.choices = request._shop_unit_type_choices
+        return formfield
 
 
 class ProductImageInline(admin.TabularInline):
@@ -40,14 +118,23 @@ class ProductImageInline(admin.TabularInline):
     fields = ("image", "order")
     ordering = ("order",)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
 
 @admin.register(ShopItem)
 class ShopItemAdmin(admin.ModelAdmin):
     list_display = ("title", "category", "is_experience", "price", "published")
     list_filter = ("category", "is_experience", "published")
+    list_select_related = ("category",)
     search_fields = ("title", "description")
     prepopulated_fields = {"slug": ("title",)}
     readonly_fields = ("created_at",)
+    autocomplete_fields = ("category",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = RepriceActionForm
+    actions = ("publish", "unpublish", "reprice")
 
     # 🔴 THIS WAS THE BUG — image MUST be listed here
     fields = (
@@ -68,6 +155,59 @@ class ShopItemAdmin(admin.ModelAdmin):
         ProductImageInline,
     ]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the full-text index instead of icontains scans over description;
+        # every match is kept, the changelist pages through them in SQL.
+        if not search_term:
+            return queryset, False
+        return filter_matching(queryset, search_term), False
+
+    # Bulk actions work in chunks of ACTION_CHUNK_SIZE rows, one transaction
+    # each, and use UPDATE - so they re-sync listings/search/caches themselves.
+    # catalog_changed() also bumps updated_at for every item in the chunk,
+    # including unit-priced items whose own row the UPDATE doesn't match.
+
+    def _set_published(self, request, queryset, published):
+        count = 0
+        for pks in _chunked_pks(queryset):
+            with transaction.atomic():
+                count += ShopItem.objects.filter(pk__in=pks).update(published=published)
+                catalog_changed(pks)
+        state = "published" if published else "unpublished"
+        self.message_user(request, f"{count} items {state}.", messages.SUCCESS)
+
+    @admin.action(description="Publish selected items")
+    def publish(self, request, queryset):
+        self._set_published(request, queryset, True)
+
+    @admin.action(description="Unpublish selected items")
+    def unpublish(self, request, queryset):
+        self._set_published(request, queryset, False)
+
+    @admin.action(description="Reprice selected items (and their units) by a percentage")
+    def reprice(self, request, queryset):
+        percent = request.POST.get("percent")
+        try:
+            factor = 1 + Decimal(percent) / 100
+        except (TypeError, ArithmeticError):
+            self.message_user(request, "Enter a percentage to reprice by.", messages.ERROR)
+            return
+        if factor <= 0:
+            self.message_user(request, "Prices can't drop by 100% or more.", messages.ERROR)
+            return
+
+        count = 0
+        for pks in _chunked_pks(queryset):
+            with transaction.atomic():
+                count += ShopItem.objects.filter(pk__in=pks, price__isnull=False).update(
+                    price=Round(F("price") * factor, 2)
+                )
+                units = ProductUnit.objects.filter(product_id__in=pks)
+                count += units.update(price=Round(F("price") * factor, 2))
+                catalog_changed(pks)
+                prices_changed(product_ids=pks, unit_ids=units.values_list("pk", flat=True))
+        self.message_user(request, f"Repriced {count} prices by {percent}%.", messages.SUCCESS)
+
 
 @admin.register(ExperienceBooking)
 class ExperienceBookingAdmin(admin.ModelAdmin):
@@ -79,8 +219,12 @@ class ExperienceBookingAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = ("status",)
+    list_select_related = ("experience",)
     search_fields = ("customer_name", "customer_email")
     readonly_fields = ("created_at", "updated_at")
+    autocomplete_fields = ("experience", "user")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(ProductType)
@@ -98,21 +242,60 @@ class UnitTypeAdmin(admin.ModelAdmin):
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "updated_at")
+    list_select_related = ("user",)
+    search_fields = ("user__username", "user__email")
     readonly_fields = ("updated_at",)
+    autocomplete_fields = ("user",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ("cart", "product", "product_unit", "qty", "unit_price")
+    list_select_related = ("cart__user", "product", "product_unit__product")
+    autocomplete_fields = ("cart", "product")
+    raw_id_fields = ("product_unit",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ("cart", "product_unit", "qty", "expires_at")
+    list_select_related = ("cart__user", "product_unit__product")
+    raw_id_fields = ("cart", "product_unit")
+    readonly_fields = ("created_at",)
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ("id", "user", "status", "created_at", "total")
     list_filter = ("status",)
+    list_select_related = ("user",)
     readonly_fields = ("created_at", "updated_at")
+    autocomplete_fields = ("user",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ("order", "title", "qty", "unit_price")
+    list_select_related = ("order",)
+    autocomplete_fields = ("product",)
+    raw_id_fields = ("order",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ("scope", "key", "user", "status_code", "created_at")
+    list_filter = ("scope",)
+    list_select_related = ("user",)
+    search_fields = ("key",)
+    raw_id_fields = ("user",)
+    readonly_fields = ("created_at",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
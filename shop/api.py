@@ -0,0 +1,74 @@
+# shop/api.py
+"""
+Read-only catalogue API: /api/shop/items/ and /api/shop/items/<slug>/.
+
+  ?fields=id,title,units   sparse fieldsets (relations not asked for are
+                           not even prefetched)
+  ?ids=3,7,12              bulk fetch by id (up to MAX_BULK_IDS)
+  ?cursor=...              keyset pagination on (created_at, id)
+
+A page costs at most three queries (items + category, active units with
+their unit type, gallery) whatever its size.
+"""
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date
+from rest_framework import viewsets
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+
+from .listing import active_units_prefetch
+from .models import ShopItem
+from .serializers import ShopItemSerializer, requested_fields
+
+MAX_BULK_IDS = 100
+CACHE_MAX_AGE = 60
+
+
+class CatalogCursorPagination(CursorPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 24
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class ShopItemViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = ShopItemSerializer
+    pagination_class = CatalogCursorPagination
+    lookup_field = "slug"
+    # public, anonymous data: skip session/auth lookups entirely
+    authentication_classes = []
+    permission_classes = []
+
+    def get_queryset(self):
+        items = ShopItem.objects.filter(published=True).select_related("category")
+
+        wanted = requested_fields(self.request)
+        if wanted is None or "units" in wanted or "effective_price" in wanted:
+            items = items.prefetch_related(active_units_prefetch())
+        if wanted is None or "gallery" in wanted:
+            items = items.prefetch_related("gallery_images")
+
+        raw_ids = self.request.query_params.get("ids")
+        if raw_ids:
+            try:
+                ids = [int(pk) for pk in raw_ids.split(",") if pk.strip()]
+            except ValueError:
+                raise ValidationError({"ids": "Expected a comma separated list of ids."})
+            if len(ids) > MAX_BULK_IDS:
+                raise ValidationError({"ids": f"At most {MAX_BULK_IDS} ids per request."})
+            items = items.filter(pk__in=ids)
+
+        return items
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code == 200:
+            patch_cache_control(response, public=True, max_age=CACHE_MAX_AGE)
+            updated_at = getattr(getattr(self, "_object", None), "updated_at", None)
+            if updated_at:
+                response["Last-Modified"] = http_date(updated_at.timestamp())
+        return response
+
+    def get_object(self):
+        self._object = super().get_object()
+        return self._object
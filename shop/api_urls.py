@@ -0,0 +1,9 @@
+# shop/api_urls.py
+from rest_framework.routers import SimpleRouter
+
+from .api import ShopItemViewSet
+
+router = SimpleRouter()
+router.register("items", ShopItemViewSet, basename="shop-item")
+
+urlpatterns = router.urls
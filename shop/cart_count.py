@@ -0,0 +1,76 @@
+# shop/cart_count.py
+"""
+Cached cart badge counts for signed-in users.
+
+The header badge is on every page, so the stored Cart.item_count is kept
+in the cache per user, under a version that is replaced (after commit)
+whenever the cart's stored totals are rewritten - see
+pricing.refresh_cart_totals, recompute_cart_totals and sweep_carts. A warm
+badge costs two cache reads and no query. A reader racing a cart change
+can only store its stale count under the old version, which is never
+read again.
+
+The cache (SHOP_CART_COUNT_CACHE) must be shared by every worker - Redis,
+Memcached, the database or file backend. A per-process LocMem cache,
+Django's default when CACHES is not set, would let one worker keep
+showing a count another has changed, so with one the count is read from
+Cart.item_count on every request instead.
+"""
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+from .models import Cart
+
+CART_COUNT_CACHE = getattr(settings, "SHOP_CART_COUNT_CACHE", "default")
+CART_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def _shared_cache():
+    cache = caches[CART_COUNT_CACHE]
+    return None if isinstance(cache, (LocMemCache, DummyCache)) else cache
+
+
+def _version_key(user_id):
+    return f"shop:cart:{user_id}:version"
+
+
+def _stored_count(user_id):
+    return (
+        Cart.objects.filter(user_id=user_id)
+        .values_list("item_count", flat=True)
+        .first()
+    ) or 0
+
+
+def cached_cart_count(user_id):
+    cache = _shared_cache()
+    if cache is None:
+        return _stored_count(user_id)
+
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), uuid4().hex, CART_COUNT_TIMEOUT)
+        version = cache.get(_version_key(user_id))
+    key = f"shop:cart:{user_id}:count:{version}"
+    count = cache.get(key)
+    if count is None:
+        count = _stored_count(user_id)
+        cache.set(key, count, CART_COUNT_TIMEOUT)
+    return count
+
+
+def forget_cart_counts(user_ids):
+    """Give these users' badge counts a new version once the transaction commits."""
+    cache = _shared_cache()
+    if cache is None:
+        return
+    keys = [_version_key(user_id) for user_id in user_ids if user_id]
+    if keys:
+        transaction.on_commit(
+            lambda: cache.set_many({key: uuid4().hex for key in keys}, CART_COUNT_TIMEOUT)
+        )
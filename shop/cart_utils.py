@@ -1,19 +1,109 @@
 # shop/cart_utils.py
-from decimal import Decimal
+from collections import namedtuple
+
 from django.conf import settings
-from .models import Cart, CartItem, ShopItem
+from django.core import signing
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import Cart, CartItem
+from .pricing import PriceBook, PriceLine, unit_price_for, refresh_cart_totals
 
 SESSION_KEY = "cart"  # {'<product_id>' or '<product_id>|<unit_id>': qty, ...}
 
+
+# ---------------------------
+# Guest cart storage. The "session cart" API below is the same either
+# way; settings.SHOP_ANON_CART_STORAGE picks where the dict lives:
+#   "session" - request.session[SESSION_KEY] (one session UPDATE per change)
+#   "cookie"  - a signed cookie written by shop.middleware.AnonCartCookieMiddleware
+# Cookie format v1: "1_<line>_<line>..." with each line "pid.qty" or
+# "pid.uid.qty", signed with a salt. Unknown versions and bad signatures
+# read as an empty cart.
+# ---------------------------
+
+COOKIE_FORMAT_VERSION = "1"
+COOKIE_SALT = "shop.cart"
+MAX_CART_COOKIE_BYTES = 2048
+
+
+class CartTooLarge(Exception):
+    pass
+
+
+def uses_cart_cookie():
+    return getattr(settings, "SHOP_ANON_CART_STORAGE", "session") == "cookie"
+
+
+def _signer():
+    return signing.get_cookie_signer(salt=COOKIE_SALT)
+
+
+def encode_cart_cookie(cart_dict):
+    lines = []
+    for key, qty in cart_dict.items():
+        pid, uid = _parse_key(key)
+        lines.append(f"{pid}.{uid}.{int(qty)}" if uid else f"{pid}.{int(qty)}")
+    value = _signer().sign("_".join([COOKIE_FORMAT_VERSION] + lines))
+    if len(value) > MAX_CART_COOKIE_BYTES:
+        raise CartTooLarge("Cart is full")
+    return value
+
+
+def decode_cart_cookie(value):
+    try:
+        version, *lines = _signer().unsign(value).split("_")
+    except signing.BadSignature:
+        return {}
+    if version != COOKIE_FORMAT_VERSION:
+        return {}
+    cart = {}
+    try:
+        for line in lines:
+            *ids, qty = (int(part) for part in line.split("."))
+            key = "|".join(str(i) for i in ids)
+            cart[key] = cart.get(key, 0) + qty
+    except ValueError:
+        return {}
+    return cart
+
+
+def _legacy_session_cart(request):
+    """A cart still sitting in the session; only touches the session if there is one."""
+    if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+        return {}
+    return request.session.get(SESSION_KEY) or {}
+
+
 def get_session_cart(request):
-    return request.session.get(SESSION_KEY, {})
+    if not uses_cart_cookie():
+        return request.session.get(SESSION_KEY, {})
+
+    if not hasattr(request, "_shop_cart"):
+        raw = request.COOKIES.get(settings.SHOP_CART_COOKIE_NAME)
+        request._shop_cart = decode_cart_cookie(raw) if raw else {}
+        request._shop_cart_dirty = False
+        if not raw:
+            # switched from session storage: move the cart into the cookie
+            legacy = _legacy_session_cart(request)
+            if legacy:
+                request.session.pop(SESSION_KEY, None)
+                save_session_cart(request, dict(legacy))
+    return request._shop_cart
+
 
 def save_session_cart(request, cart_dict):
-    request.session[SESSION_KEY] = cart_dict
-    request.session.modified = True
+    if not uses_cart_cookie():
+        request.session[SESSION_KEY] = cart_dict
+        request.session.modified = True
+        return
+    if cart_dict:
+        encode_cart_cookie(cart_dict)  # raises CartTooLarge before anything changes
+    request._shop_cart = cart_dict
+    request._shop_cart_dirty = True
 
 def add_to_session_cart(request, product_id, qty=1, product_unit_id=None):
-    cart = get_session_cart(request)
+    cart = dict(get_session_cart(request))
     if product_unit_id:
         key = f"{product_id}|{product_unit_id}"
     else:
@@ -23,95 +113,284 @@ def add_to_session_cart(request, product_id, qty=1, product_unit_id=None):
     return cart
 
 def remove_from_session_cart(request, product_id, product_unit_id=None):
-    cart = get_session_cart(request)
+    cart = dict(get_session_cart(request))
     key = f"{product_id}|{product_unit_id}" if product_unit_id else str(product_id)
     if key in cart:
         del cart[key]
         save_session_cart(request, cart)
     return cart
 
+def _parse_key(key):
+    """'<product_id>' or '<product_id>|<unit_id>' -> (product_id, unit_id or None)."""
+    if "|" in key:
+        pid_str, uid_str = key.split("|", 1)
+        return int(pid_str), int(uid_str)
+    return int(key), None
+
+
+def session_cart_lines(request):
+    lines = []
+    for key, qty in get_session_cart(request).items():
+        pid, uid = _parse_key(key)
+        lines.append(PriceLine(pid, uid, int(qty)))
+    return lines
+
+
+def price_session_cart(request):
+    """Price the session cart at current prices (two queries)."""
+    lines = session_cart_lines(request)
+    if not lines:
+        return PriceBook({}).price([])
+    return PriceBook.load(lines).price(lines)
+
+
 def session_cart_to_items(request):
-    """Return list of dicts with product, optional product_unit, qty and line_total for rendering."""
-    cart = get_session_cart(request)
-    rows = []
-    if not cart:
-        return rows
-
-    product_keys = []
-    unit_keys = {}
-    for key in cart.keys():
-        if "|" in key:
-            pid_str, unit_str = key.split("|", 1)
-            product_keys.append(int(pid_str))
-            unit_keys.setdefault(int(pid_str), []).append(int(unit_str))
-        else:
-            product_keys.append(int(key))
-
-    products = ShopItem.objects.filter(id__in=product_keys, published=True)
-    products_map = {p.id: p for p in products}
-
-    # preload units for relevant products
-    from .models import ProductUnit
-    unit_ids = []
-    for vals in unit_keys.values():
-        unit_ids.extend(vals)
-    units = ProductUnit.objects.filter(id__in=unit_ids, is_active=True) if unit_ids else []
-    units_map = {u.id: u for u in units}
-
-    for key, qty in cart.items():
-        if "|" in key:
-            pid_str, unit_str = key.split("|", 1)
-            pid = int(pid_str)
-            uid = int(unit_str)
-            p = products_map.get(pid)
-            u = units_map.get(uid)
-            if not p or not u:
-                continue
-            line_total = (u.price or 0) * int(qty)
-            rows.append({"product": p, "product_unit": u, "qty": qty, "line_total": line_total})
-        else:
-            pid = int(key)
-            p = products_map.get(pid)
-            if not p:
-                continue
-            line_total = (p.price or 0) * int(qty)
-            rows.append({"product": p, "product_unit": None, "qty": qty, "line_total": line_total})
+    """Return list of dicts with product, optional product_unit, qty, unit_price and line_total for rendering."""
+    return price_session_cart(request)["lines"]
+
+# ---------------------------
+# DB carts: every CartItem change goes through here so Cart's stored
+# totals are rewritten in the same transaction.
+# ---------------------------
+
+def lock_cart(cart):
+    """Serialize writers per cart so the stored totals can't miss an update."""
+    list(Cart.objects.select_for_update().filter(pk=cart.pk).order_by().values_list("pk", flat=True))
+
+
+def upsert_cart_line(cart_id, product_id, product_unit_id, qty, unit_price):
+    """
+    Add qty to a cart line, creating it if needed, in one statement:
+    INSERT ... ON CONFLICT DO UPDATE SET qty = qty + excluded.qty against
+    the partial unique constraint matching whether there is a unit.
+    """
+    if connection.vendor not in ("sqlite", "postgresql"):
+        ci, created = CartItem.objects.get_or_create(
+            cart_id=cart_id,
+            product_id=product_id,
+            product_unit_id=product_unit_id,
+            defaults={"qty": qty, "unit_price": unit_price},
+        )
+        if not created:
+            CartItem.objects.filter(pk=ci.pk).update(qty=F("qty") + qty, unit_price=unit_price)
+        return
+
+    qn = connection.ops.quote_name
+    table = qn(CartItem._meta.db_table)
+    if product_unit_id:
+        target = "(cart_id, product_id, product_unit_id) WHERE product_unit_id IS NOT NULL"
+    else:
+        target = "(cart_id, product_id) WHERE product_unit_id IS NULL"
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (cart_id, product_id, product_unit_id, qty, unit_price) "
+            f"VALUES (%s, %s, %s, %s, %s) "
+            f"ON CONFLICT {target} "
+            f"DO UPDATE SET qty = {table}.qty + excluded.qty, unit_price = excluded.unit_price",
+            [cart_id, product_id, product_unit_id or None, qty, unit_price],
+        )
+
+
+def add_to_db_cart(cart, product, product_unit=None, qty=1):
+    """Add qty of a product (unit) at today's price; returns the cart summary."""
+    unit_price = unit_price_for(product, product_unit)
+    with transaction.atomic():
+        lock_cart(cart)
+        upsert_cart_line(
+            cart.pk, product.pk, product_unit.pk if product_unit else None, qty, unit_price
+        )
+        return refresh_cart_totals(cart)
+
+
+def remove_from_db_cart(cart, product_id, product_unit_id=None):
+    """Drop a line from the cart; returns the cart summary."""
+    with transaction.atomic():
+        lock_cart(cart)
+        CartItem.objects.filter(
+            cart=cart, product_id=product_id, product_unit_id=product_unit_id or None
+        ).delete()
+        return refresh_cart_totals(cart)
 
-    return rows
 
 def merge_session_cart_to_user(request, user):
-    """Create or get Cart for user and merge session cart items in DB."""
-    session_cart = get_session_cart(request)
-    if not session_cart:
+    """
+    Merge the guest cart into the user's DB cart at login, in a fixed number
+    of queries however many lines there are (see _merge_lines).
+    """
+    lines = session_cart_lines(request)
+    if uses_cart_cookie() and request.COOKIES.get(settings.SHOP_CART_COOKIE_NAME):
+        # a cart left in the session from before the switch to cookies
+        lines += [
+            PriceLine(*_parse_key(key), int(qty))
+            for key, qty in _legacy_session_cart(request).items()
+        ]
+    if not lines:
         return
     cart, _ = Cart.objects.get_or_create(user=user)
-    for key, qty in session_cart.items():
-        if "|" in key:
-            pid_str, uid_str = key.split("|", 1)
-            pid = int(pid_str)
-            uid = int(uid_str)
+    book = PriceBook.load(lines)
+    with transaction.atomic():
+        lock_cart(cart)
+        _merge_lines(cart, book, lines)
+        refresh_cart_totals(cart)
+    # clear the guest cart (cookie and/or session)
+    save_session_cart(request, {})
+    if uses_cart_cookie() and _legacy_session_cart(request):
+        request.session.pop(SESSION_KEY, None)
+
+
+def _merge_lines(cart, book, lines):
+    """Fold priced guest lines into the cart: one read, one bulk insert, one bulk update."""
+    wanted = {}
+    for line in lines:
+        product = book.products.get(line.product_id)
+        if product is None:
+            continue
+        unit = book.units.get(line.product_unit_id) if line.product_unit_id else None
+        if unit is not None and unit.product_id != product.pk:
+            unit = None
+
+        key = (product.pk, unit.pk if unit else None)
+        qty = wanted[key][0] if key in wanted else 0
+        wanted[key] = (qty + line.qty, unit_price_for(product, unit))
+
+    if not wanted:
+        return
+    existing = {
+        (ci.product_id, ci.product_unit_id): ci
+        for ci in CartItem.objects.filter(cart=cart, product_id__in={pid for pid, _uid in wanted})
+    }
+
+    new, changed = [], []
+    for (product_id, unit_id), (qty, unit_price) in wanted.items():
+        ci = existing.get((product_id, unit_id))
+        if ci is None:
+            new.append(CartItem(
+                cart=cart, product_id=product_id, product_unit_id=unit_id,
+                qty=qty, unit_price=unit_price,
+            ))
         else:
-            pid = int(key)
-            uid = None
+            ci.qty += qty
+            ci.unit_price = unit_price or ci.unit_price
+            changed.append(ci)
+
+    CartItem.objects.bulk_create(new)
+    CartItem.objects.bulk_update(changed, ["qty", "unit_price"])
+
+
+# ---------------------------
+# Batched edits: a list of add / set_qty / remove operations applied to
+# either kind of cart in one go (see views.cart_batch).
+# ---------------------------
+
+CART_OPS = ("add", "set_qty", "remove")
+MAX_CART_OPS = 50
+
+
+class CartOpError(ValueError):
+    pass
+
+
+CartOp = namedtuple("CartOp", "op product_id product_unit_id qty")
+
+
+def parse_cart_ops(raw_ops):
+    """Validate the shape of [{"op", "product_id", "product_unit_id"?, "qty"?}, ...]."""
+    if not isinstance(raw_ops, list) or not raw_ops:
+        raise CartOpError("ops must be a non-empty list")
+    if len(raw_ops) > MAX_CART_OPS:
+        raise CartOpError(f"At most {MAX_CART_OPS} ops per request")
+
+    ops = []
+    for index, raw in enumerate(raw_ops):
         try:
-            product = ShopItem.objects.get(id=pid, published=True)
-        except ShopItem.DoesNotExist:
+            op = raw["op"]
+            default_qty = 1 if op == "add" else 0
+            product_id = int(raw["product_id"])
+            product_unit_id = int(raw.get("product_unit_id") or 0) or None
+            qty = int(raw.get("qty", default_qty))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            raise CartOpError(f"ops[{index}]: malformed op")
+        if op not in CART_OPS:
+            raise CartOpError(f"ops[{index}]: unknown op {op!r}")
+        if qty < 0 or (op == "add" and qty < 1):
+            raise CartOpError(f"ops[{index}]: invalid qty")
+        ops.append(CartOp(op, product_id, product_unit_id, qty))
+    return ops
+
+
+def _apply_ops(quantities, ops, book):
+    """
+    Apply ops to {(product_id, unit_id): qty} in order. Lines being added or
+    set must be for purchasable products/units in the PriceBook. Returns
+    the new quantities and the keys the ops touched.
+    """
+    quantities = dict(quantities)
+    touched = set()
+    for index, op in enumerate(ops):
+        key = (op.product_id, op.product_unit_id)
+        touched.add(key)
+        if op.op == "remove" or (op.op == "set_qty" and op.qty == 0):
+            quantities.pop(key, None)
             continue
 
-        if uid:
-            try:
-                unit = ProductUnit.objects.get(id=uid, product=product, is_active=True)
-            except ProductUnit.DoesNotExist:
-                unit = None
-        else:
-            unit = None
+        product = book.products.get(op.product_id)
+        unit = book.units.get(op.product_unit_id) if op.product_unit_id else None
+        if product is None or (op.product_unit_id and (unit is None or unit.product_id != product.pk)):
+            raise CartOpError(f"ops[{index}]: product or unit not available")
+        quantities[key] = (quantities.get(key, 0) if op.op == "add" else 0) + op.qty
+    return quantities, touched
 
-        defaults = {"qty": qty, "unit_price": (unit.price if unit else (product.price or 0)), "product_unit": unit}
-        ci, created = CartItem.objects.get_or_create(cart=cart, product=product, product_unit=unit, defaults=defaults)
-        if not created:
-            ci.qty = ci.qty + qty
-            ci.unit_price = defaults["unit_price"] or ci.unit_price
-            ci.save()
-    # clear session cart
-    request.session[SESSION_KEY] = {}
-    request.session.modified = True
+
+def _load_book(ops):
+    lines = [PriceLine(op.product_id, op.product_unit_id, op.qty) for op in ops if op.op != "remove"]
+    return PriceBook.load(lines) if lines else PriceBook({})
+
+
+def apply_ops_to_db_cart(cart, ops):
+    """Apply ops atomically to a DB cart; returns the cart summary."""
+    book = _load_book(ops)
+    with transaction.atomic():
+        lock_cart(cart)
+        existing = {
+            (ci.product_id, ci.product_unit_id): ci
+            for ci in CartItem.objects.filter(cart=cart, product_id__in={op.product_id for op in ops})
+        }
+        quantities, touched = _apply_ops(
+            {key: ci.qty for key, ci in existing.items()}, ops, book
+        )
+
+        new, changed, gone = [], [], []
+        for key in touched:
+            ci = existing.get(key)
+            if key not in quantities:
+                if ci is not None:
+                    gone.append(ci.pk)
+                continue
+            product_id, unit_id = key
+            unit_price = unit_price_for(book.products[product_id], book.units.get(unit_id))
+            if ci is None:
+                new.append(CartItem(
+                    cart=cart, product_id=product_id, product_unit_id=unit_id,
+                    qty=quantities[key], unit_price=unit_price,
+                ))
+            elif (ci.qty, ci.unit_price) != (quantities[key], unit_price):
+                ci.qty, ci.unit_price = quantities[key], unit_price
+                changed.append(ci)
+
+        if gone:
+            CartItem.objects.filter(pk__in=gone).delete()
+        CartItem.objects.bulk_create(new)
+        CartItem.objects.bulk_update(changed, ["qty", "unit_price"])
+        return refresh_cart_totals(cart)
+
+
+def apply_ops_to_session_cart(request, ops):
+    """Apply ops to the guest cart with a single write; returns the priced summary."""
+    book = _load_book(ops)
+    quantities, _touched = _apply_ops(
+        {_parse_key(key): int(qty) for key, qty in get_session_cart(request).items()}, ops, book
+    )
+    save_session_cart(request, {
+        (f"{pid}|{uid}" if uid else str(pid)): qty for (pid, uid), qty in quantities.items()
+    })
+    return price_session_cart(request)
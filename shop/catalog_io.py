@@ -0,0 +1,404 @@
+# shop/catalog_io.py
+"""
+Bulk catalogue import/export (see the import_catalog / export_catalog
+commands).
+
+A catalogue is four sheets - categories, items, units, images - either as
+four CSV files in a directory (categories.csv, ...) or as four worksheets
+of one .xlsx workbook. Rows are keyed by slug (units by item slug + label,
+images by item slug + image path), streamed in chunks, diffed against the
+database and written with bulk_create / bulk_update, one transaction per
+chunk. Columns missing from a sheet are left untouched.
+"""
+import csv
+import os
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import ShopCategory, ShopItem, ProductUnit, ProductImage, UnitType
+from .repricing import prices_changed
+from .signals import catalog_changed
+
+SHEETS = ("categories", "items", "units", "images")
+
+COLUMNS = {
+    "categories": ("slug", "name"),
+    "items": (
+        "slug", "title", "category", "description", "price", "tax_percent",
+        "is_experience", "published", "image",
+    ),
+    "units": ("item", "label", "unit_type", "value", "price", "is_default", "is_active"),
+    "images": ("item", "image", "order"),
+}
+
+BATCH_SIZE = 1000
+
+
+class CatalogError(Exception):
+    pass
+
+
+# ---------------------------
+# Value parsing
+# ---------------------------
+
+def _text(value):
+    return "" if value is None else str(value).strip()
+
+
+def _bool(value):
+    return _text(value).lower() in ("1", "true", "yes", "y")
+
+
+def _decimal(value):
+    raw = _text(value)
+    if not raw:
+        return None
+    try:
+        return Decimal(raw).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise CatalogError(f"Not a number: {raw!r}")
+
+
+def _int(value):
+    raw = _text(value)
+    return int(Decimal(raw)) if raw else 0
+
+
+def _last_by(rows, key):
+    """Drop repeated keys within a chunk; the last row wins."""
+    return list({key(r): r for r in rows}.values())
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ---------------------------
+# Reading / writing
+# ---------------------------
+
+def is_xlsx(path):
+    return str(path).lower().endswith(".xlsx")
+
+
+def read_sheet(path, sheet):
+    """Yield dicts for one sheet; nothing if the file / worksheet is absent."""
+    if is_xlsx(path):
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            if sheet not in workbook.sheetnames:
+                return
+            rows = workbook[sheet].iter_rows(values_only=True)
+            header = [_text(h) for h in next(rows, ())]
+            for row in rows:
+                if any(cell not in (None, "") for cell in row):
+                    yield dict(zip(header, row))
+        finally:
+            workbook.close()
+    else:
+        filename = os.path.join(path, f"{sheet}.csv")
+        if not os.path.exists(filename):
+            return
+        with open(filename, newline="", encoding="utf-8") as fh:
+            yield from csv.DictReader(fh)
+
+
+def export_rows(sheet, chunk_size=BATCH_SIZE):
+    """Yield value tuples for a sheet, in COLUMNS order, streamed from the DB."""
+    if sheet == "categories":
+        qs = ShopCategory.objects.order_by("pk").values_list("slug", "name")
+    elif sheet == "items":
+        qs = ShopItem.objects.order_by("pk").values_list(
+            "slug", "title", "category__slug", "description", "price", "tax_percent",
+            "is_experience", "published", "image",
+        )
+    elif sheet == "units":
+        qs = ProductUnit.objects.order_by("pk").values_list(
+            "product__slug", "label", "unit_type__code", "value", "price",
+            "is_default", "is_active",
+        )
+    else:
+        qs = ProductImage.objects.order_by("pk").values_list("product__slug", "image", "order")
+
+    for row in qs.iterator(chunk_size=chunk_size):
+        yield tuple(
+            "" if v is None else (int(v) if isinstance(v, bool) else v) for v in row
+        )
+
+
+def export_catalog(path, chunk_size=BATCH_SIZE):
+    """Write the catalogue to `path` (.xlsx workbook or CSV directory). Returns row counts."""
+    counts = Counter()
+    if is_xlsx(path):
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        for sheet in SHEETS:
+            ws = workbook.create_sheet(sheet)
+            ws.append(COLUMNS[sheet])
+            for row in export_rows(sheet, chunk_size):
+                ws.append([str(v) if isinstance(v, Decimal) else v for v in row])
+                counts[sheet] += 1
+        workbook.save(path)
+    else:
+        os.makedirs(path, exist_ok=True)
+        for sheet in SHEETS:
+            with open(os.path.join(path, f"{sheet}.csv"), "w", newline="", encoding="utf-8") as fh:
+                writer = csv.writer(fh)
+                writer.writerow(COLUMNS[sheet])
+                for row in export_rows(sheet, chunk_size):
+                    writer.writerow(row)
+                    counts[sheet] += 1
+    return counts
+
+
+# ---------------------------
+# Import
+# ---------------------------
+
+def _apply(obj, values):
+    """Set changed attributes on obj; return the names that changed."""
+    changed = []
+    for name, value in values.items():
+        if getattr(obj, name) != value:
+            setattr(obj, name, value)
+            changed.append(name)
+    return changed
+
+
+class CatalogImporter:
+    def __init__(self, batch_size=BATCH_SIZE, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.stats = {sheet: Counter() for sheet in SHEETS}
+
+    def run(self, path):
+        if self.dry_run:
+            # one transaction, rolled back: later sheets still see earlier rows
+            with transaction.atomic():
+                self._run(path)
+                transaction.set_rollback(True)
+        else:
+            self._run(path)
+        return self.stats
+
+    def _run(self, path):
+        for sheet in SHEETS:
+            handler = getattr(self, f"_import_{sheet}")
+            for chunk in _chunks(read_sheet(path, sheet), self.batch_size):
+                with transaction.atomic():
+                    touched = handler(chunk)
+                    if touched:
+                        catalog_changed(touched)
+
+    def _write(self, sheet, model, create, update, fields):
+        stats = self.stats[sheet]
+        if create:
+            model.objects.bulk_create(create, batch_size=self.batch_size)
+            stats["created"] += len(create)
+        if update:
+            model.objects.bulk_update(update, sorted(fields), batch_size=self.batch_size)
+            stats["updated"] += len(update)
+
+    # ---- categories ----
+    def _import_categories(self, rows):
+        rows = [r for r in rows if _text(r.get("name")) or _text(r.get("slug"))]
+        for r in rows:
+            r["slug"] = _text(r.get("slug")) or slugify(_text(r.get("name")))
+        rows = _last_by(rows, lambda r: r["slug"])
+        existing = ShopCategory.objects.in_bulk([r["slug"] for r in rows], field_name="slug")
+
+        create, update, fields = [], [], set()
+        for r in rows:
+            obj = existing.get(r["slug"])
+            values = {"name": _text(r["name"])} if "name" in r else {}
+            if obj is None:
+                create.append(ShopCategory(slug=r["slug"], **values))
+            elif changed := _apply(obj, values):
+                update.append(obj)
+                fields.update(changed)
+            else:
+                self.stats["categories"]["unchanged"] += 1
+        self._write("categories", ShopCategory, create, update, fields)
+
+        # category names/slugs feed every listing row in them
+        if update:
+            return ShopItem.objects.filter(category__in=update).values_list("pk", flat=True)
+        return ()
+
+    # ---- items ----
+    def _item_values(self, r, categories):
+        values = {}
+        if "title" in r:
+            values["title"] = _text(r["title"])
+        if "category" in r:
+            slug = _text(r["category"])
+            if slug not in categories:
+                raise CatalogError(f"Item {r['slug']!r}: unknown category {slug!r}")
+            values["category_id"] = categories[slug]
+        if "description" in r:
+            values["description"] = _text(r["description"])
+        if "price" in r:
+            values["price"] = _decimal(r["price"])
+        if "tax_percent" in r:
+            values["tax_percent"] = _decimal(r["tax_percent"]) or Decimal("0.00")
+        for flag in ("is_experience", "published"):
+            if flag in r:
+                values[flag] = _bool(r[flag])
+        if "image" in r:
+            values["image"] = _text(r["image"])
+        return values
+
+    def _import_items(self, rows):
+        rows = [r for r in rows if _text(r.get("slug")) or _text(r.get("title"))]
+        for r in rows:
+            r["slug"] = _text(r.get("slug")) or slugify(_text(r.get("title")))[:255]
+        rows = _last_by(rows, lambda r: r["slug"])
+        existing = ShopItem.objects.in_bulk([r["slug"] for r in rows], field_name="slug")
+        categories = dict(
+            ShopCategory.objects.filter(
+                slug__in={_text(r.get("category")) for r in rows}
+            ).values_list("slug", "pk")
+        )
+
+        now = timezone.now()
+        create, update, fields = [], [], set()
+        repriced, retaxed = [], []
+        for r in rows:
+            values = self._item_values(r, categories)
+            obj = existing.get(r["slug"])
+            if obj is None:
+                if "category_id" not in values:
+                    raise CatalogError(f"New item {r['slug']!r} needs a category")
+                create.append(ShopItem(slug=r["slug"], **values))
+            elif changed := _apply(obj, values):
+                obj.updated_at = now  # bulk_update skips auto_now
+                update.append(obj)
+                fields.update(changed + ["updated_at"])
+                if "price" in changed:
+                    repriced.append(obj.pk)
+                if "tax_percent" in changed:
+                    retaxed.append(obj.pk)
+            else:
+                self.stats["items"]["unchanged"] += 1
+        self._write("items", ShopItem, create, update, fields)
+        # bulk_update skips signals, so open carts are repriced here
+        prices_changed(product_ids=repriced, tax_product_ids=retaxed)
+
+        touched = [obj.pk for obj in update]
+        if create:
+            touched += ShopItem.objects.filter(
+                slug__in=[obj.slug for obj in create]
+            ).values_list("pk", flat=True)
+        return touched
+
+    # ---- units ----
+    def _unit_types(self, codes):
+        known = dict(UnitType.objects.filter(code__in=codes).values_list("code", "pk"))
+        missing = [UnitType(code=code, name=code.replace("-", " ").title()) for code in codes - set(known)]
+        if missing:
+            UnitType.objects.bulk_create(missing)
+            known.update(UnitType.objects.filter(code__in=[u.code for u in missing]).values_list("code", "pk"))
+        return known
+
+    def _item_ids(self, rows):
+        slugs = {_text(r.get("item")) for r in rows}
+        items = dict(ShopItem.objects.filter(slug__in=slugs).values_list("slug", "pk"))
+        unknown = slugs - set(items)
+        if unknown:
+            raise CatalogError(f"Unknown item slug(s): {', '.join(sorted(unknown))}")
+        return items
+
+    def _import_units(self, rows):
+        rows = [r for r in rows if _text(r.get("item")) and _text(r.get("label"))]
+        rows = _last_by(rows, lambda r: (_text(r["item"]), _text(r["label"])))
+        items = self._item_ids(rows)
+        unit_types = self._unit_types({_text(r["unit_type"]) for r in rows if _text(r.get("unit_type"))})
+        existing = {
+            (u.product_id, u.label): u
+            for u in ProductUnit.objects.filter(product_id__in=items.values())
+        }
+
+        create, update, fields = [], [], set()
+        repriced = []
+        defaults = {}
+        for r in rows:
+            product_id = items[_text(r["item"])]
+            label = _text(r["label"])
+            values = {}
+            if _text(r.get("unit_type")):
+                values["unit_type_id"] = unit_types[_text(r["unit_type"])]
+            if "value" in r:
+                values["value"] = _text(r["value"])
+            if "price" in r:
+                values["price"] = _decimal(r["price"])
+            for flag in ("is_default", "is_active"):
+                if flag in r:
+                    values[flag] = _bool(r[flag])
+
+            obj = existing.get((product_id, label))
+            if obj is None:
+                if "unit_type_id" not in values or values.get("price") is None:
+                    raise CatalogError(f"New unit {r['item']!r}/{label!r} needs unit_type and price")
+                obj = ProductUnit(product_id=product_id, label=label, **values)
+                create.append(obj)
+            elif changed := _apply(obj, values):
+                update.append(obj)
+                fields.update(changed)
+                if "price" in changed:
+                    repriced.append(obj.pk)
+            else:
+                self.stats["units"]["unchanged"] += 1
+            if values.get("is_default"):
+                defaults[product_id] = label
+        self._write("units", ProductUnit, create, update, fields)
+        prices_changed(unit_ids=repriced)
+
+        # bulk writes bypass ProductUnit.save(): keep one default per product
+        for product_id, label in defaults.items():
+            ProductUnit.objects.filter(product_id=product_id, is_default=True).exclude(
+                label=label
+            ).update(is_default=False)
+
+        return {obj.product_id for obj in create + update}
+
+    # ---- images ----
+    def _import_images(self, rows):
+        rows = [r for r in rows if _text(r.get("item")) and _text(r.get("image"))]
+        rows = _last_by(rows, lambda r: (_text(r["item"]), _text(r["image"])))
+        items = self._item_ids(rows)
+        existing = {
+            (g.product_id, g.image.name): g
+            for g in ProductImage.objects.filter(product_id__in=items.values())
+        }
+
+        create, update, fields = [], [], set()
+        for r in rows:
+            product_id = items[_text(r["item"])]
+            name = _text(r["image"])
+            values = {"order": _int(r["order"])} if "order" in r else {}
+            obj = existing.get((product_id, name))
+            if obj is None:
+                obj = ProductImage(product_id=product_id, image=name, **values)
+                create.append(obj)
+            elif changed := _apply(obj, values):
+                update.append(obj)
+                fields.update(changed)
+            else:
+                self.stats["images"]["unchanged"] += 1
+        self._write("images", ProductImage, create, update, fields)
+
+        return {obj.product_id for obj in create + update}
@@ -0,0 +1,222 @@
+# shop/facets.py
+"""
+Combined shop filters (category, price band, unit type, kind, stock) with
+live counts.
+
+Counts are not COUNT queries: the whole listing is folded once into a
+small table of "combinations" (one entry per distinct category / band /
+kind / stock / unit-type set, with how many items share it) and cached.
+Every facet count for any filter state is then a pass over that table in
+memory. The cache key carries the listing table's version (row count and
+latest updated_at, one indexed aggregate), so the first request after a
+catalogue change rebuilds it in every process.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Exists, Max, OuterRef
+from django.utils.http import urlencode
+
+from .models import ShopItemListing, ProductUnit, UnitType
+
+# Unit type names aren't part of the version; this (and the facet bar
+# fragment's timeout) bounds how long a renamed one can show.
+CACHE_TIMEOUT = 60 * 10
+
+# (slug, label, lower bound inclusive, upper bound exclusive)
+PRICE_BANDS = (
+    ("under-500", "Under ₹500", None, Decimal("500")),
+    ("500-1500", "₹500 – ₹1,500", Decimal("500"), Decimal("1500")),
+    ("1500-3000", "₹1,500 – ₹3,000", Decimal("1500"), Decimal("3000")),
+    ("3000-plus", "₹3,000 +", Decimal("3000"), None),
+)
+
+KINDS = (
+    ("product", "Products"),
+    ("experience", "Experiences"),
+)
+
+# query-string parameter for each facet, in display order
+FACET_PARAMS = ("category", "price", "unit", "kind", "in_stock")
+
+
+def price_band(price):
+    if price is None:
+        return None
+    for slug, _, low, high in PRICE_BANDS:
+        if (low is None or price >= low) and (high is None or price < high):
+            return slug
+    return None
+
+
+# ---------------------------
+# Cached aggregate
+# ---------------------------
+
+def facet_version():
+    """Row count and latest updated_at of the listing table."""
+    stats = ShopItemListing.objects.aggregate(rows=Count("pk"), latest=Max("updated_at"))
+    latest = stats["latest"].timestamp() if stats["latest"] else 0
+    return f"{stats['rows']}-{latest:.6f}"
+
+
+def _build_aggregate():
+    combos = Counter()
+    categories = {}
+    rows = ShopItemListing.objects.values_list(
+        "category_slug", "category_name", "price", "is_experience", "in_stock", "units"
+    )
+    for category_slug, category_name, price, is_experience, in_stock, units in rows:
+        categories[category_slug] = category_name
+        unit_types = tuple(sorted({u["unit_type"] for u in units}))
+        combos[(
+            category_slug,
+            price_band(price),
+            "experience" if is_experience else "product",
+            bool(in_stock),
+            unit_types,
+        )] += 1
+
+    return {
+        "combos": list(combos.items()),
+        "categories": sorted(categories.items(), key=lambda c: c[1]),
+        "unit_types": list(UnitType.objects.order_by("name").values_list("code", "name")),
+    }
+
+
+def get_aggregate():
+    key = f"shop:facets:{facet_version()}"
+    aggregate = cache.get(key)
+    if aggregate is None:
+        aggregate = _build_aggregate()
+        cache.set(key, aggregate, CACHE_TIMEOUT)
+    return aggregate
+
+
+# ---------------------------
+# Request side
+# ---------------------------
+
+def selected_facets(params):
+    """Pick the facet filters out of a QueryDict; unknown values are dropped."""
+    selected = {}
+    for name in FACET_PARAMS:
+        value = params.get(name)
+        if value:
+            selected[name] = value
+    if selected.get("in_stock") not in (None, "1"):
+        del selected["in_stock"]
+    if selected.get("kind") not in (None, "product", "experience"):
+        del selected["kind"]
+    if "price" in selected and selected["price"] not in {b[0] for b in PRICE_BANDS}:
+        del selected["price"]
+    return selected
+
+
+def apply_facets(queryset, selected):
+    """Filter a ShopItemListing queryset by the selected facets."""
+    if "category" in selected:
+        queryset = queryset.filter(category_slug=selected["category"])
+    if "price" in selected:
+        for slug, _, low, high in PRICE_BANDS:
+            if slug == selected["price"]:
+                if low is not None:
+                    queryset = queryset.filter(price__gte=low)
+                if high is not None:
+                    queryset = queryset.filter(price__lt=high)
+    if "unit" in selected:
+        queryset = queryset.filter(Exists(
+            ProductUnit.objects.filter(
+                product_id=OuterRef("item_id"),
+                is_active=True,
+                unit_type__code=selected["unit"],
+            )
+        ))
+    if "kind" in selected:
+        queryset = queryset.filter(is_experience=selected["kind"] == "experience")
+    if "in_stock" in selected:
+        queryset = queryset.filter(in_stock=True)
+    return queryset
+
+
+def _matches(combo, selected, skip):
+    category, band, kind, in_stock, unit_types = combo
+    checks = {
+        "category": lambda v: category == v,
+        "price": lambda v: band == v,
+        "unit": lambda v: v in unit_types,
+        "kind": lambda v: kind == v,
+        "in_stock": lambda v: in_stock,
+    }
+    return all(
+        checks[name](value) for name, value in selected.items() if name != skip
+    )
+
+
+def facet_counts(selected):
+    """
+    Count per facet value, each counted against every *other* active
+    filter, so a shopper sees what picking that value would give them.
+    """
+    aggregate = get_aggregate()
+    counts = {name: Counter() for name in FACET_PARAMS}
+
+    for combo, n in aggregate["combos"]:
+        category, band, kind, in_stock, unit_types = combo
+        for name in FACET_PARAMS:
+            if not _matches(combo, selected, skip=name):
+                continue
+            if name == "category":
+                counts[name][category] += n
+            elif name == "price" and band:
+                counts[name][band] += n
+            elif name == "unit":
+                for code in unit_types:
+                    counts[name][code] += n
+            elif name == "kind":
+                counts[name][kind] += n
+            elif name == "in_stock" and in_stock:
+                counts[name]["1"] += n
+
+    return counts, aggregate
+
+
+def facet_groups(selected):
+    """Facet values with labels, counts and toggle URLs for the template."""
+    counts, aggregate = facet_counts(selected)
+
+    def option(name, value, label):
+        params = dict(selected)
+        active = params.get(name) == value
+        if active:
+            del params[name]
+        else:
+            params[name] = value
+        return {
+            "value": value,
+            "label": label,
+            "count": counts[name][value],
+            "active": active,
+            "url": "?" + urlencode(params) if params else "?",
+        }
+
+    groups = [
+        ("category", "Category", aggregate["categories"]),
+        ("price", "Price", [(slug, label) for slug, label, _, _ in PRICE_BANDS]),
+        ("unit", "Unit", aggregate["unit_types"]),
+        ("kind", "Type", KINDS),
+        ("in_stock", "Availability", [("1", "In stock")]),
+    ]
+    return [
+        {
+            "name": name,
+            "label": label,
+            "options": [
+                option(name, value, value_label)
+                for value, value_label in values
+                if counts[name][value] or selected.get(name) == value
+            ],
+        }
+        for name, label, values in groups
+    ]
@@ -0,0 +1,29 @@
+# shop/fragment_cache.py
+"""
+Version keys for cached template fragments.
+
+Templates put a version in their `{% cache %}` keys: a card's is its
+ShopItemListing.updated_at, the product page's its ShopItem.updated_at.
+Every catalogue change moves those (refresh_listings() rewrites the
+listing row, shop.signals.catalog_changed() bumps the item), so a changed
+item gets a fresh key and is re-rendered, while unchanged cards are
+served from the cache. The versions come from rows the view has already
+loaded - no extra query, and every process agrees on them whichever
+cache backend is configured.
+"""
+
+
+def fragment_version(updated_at):
+    return f"{updated_at.timestamp():.6f}"
+
+
+def item_version(item):
+    """Version of a ShopItem's product page fragment."""
+    return fragment_version(item.updated_at)
+
+
+def attach_fragment_versions(rows):
+    """Set `fragment_version` on ShopItemListing rows."""
+    for row in rows:
+        row.fragment_version = fragment_version(row.updated_at)
+    return rows
@@ -0,0 +1,141 @@
+# shop/idempotency.py
+"""
+Idempotency keys for the write endpoints (placing an order, booking an
+experience).
+
+A client sends a key with its POST, as an Idempotency-Key header or an
+idempotency_key form field. The first request with a key claims it by
+inserting an IdempotencyKey row (the unique constraint on scope + key
+settles any race), runs the view and stores the response on the row.
+A replay costs one indexed SELECT: the stored response comes back as-is
+without running the view, opening a transaction or taking the cart lock.
+
+A replay that arrives while the first request is still running gets an
+immediate 409 (nothing waits on a worker); so does one racing a first
+request that failed and gave its key back. Reusing a key for a different
+request (other fields, other user) gets 422. Server errors release the
+key so the client can retry. A key whose request never finished (the
+worker was killed) is held for SHOP_IDEMPOTENCY_LEASE_SECONDS only; after
+that the next retry takes it over and runs the view. Requests without a
+key run as before. Keys are kept for SHOP_IDEMPOTENCY_KEY_HOURS;
+sweep_carts purges them.
+"""
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+KEY_HEADER = "Idempotency-Key"
+KEY_FIELD = "idempotency_key"
+MAX_KEY_LENGTH = 255
+KEY_TTL_HOURS = getattr(settings, "SHOP_IDEMPOTENCY_KEY_HOURS", 24)
+LEASE_SECONDS = getattr(settings, "SHOP_IDEMPOTENCY_LEASE_SECONDS", 120)
+REPLAYED_HEADER = "Idempotent-Replayed"
+STORED_HEADERS = ("Content-Type", "Location")
+FORM_TYPES = ("application/x-www-form-urlencoded", "multipart/form-data")
+
+
+def _fingerprint(request):
+    """Hash of what the request asks for, leaving out the key and CSRF token."""
+    digest = hashlib.sha256(request.path.encode())
+    if request.content_type in FORM_TYPES:
+        for name, values in sorted(request.POST.lists()):
+            if name not in (KEY_FIELD, "csrfmiddlewaretoken"):
+                digest.update(repr((name, values)).encode())
+    else:
+        digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = HttpResponse(record.body, status=record.status_code, headers=record.headers)
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def _in_progress():
+    return JsonResponse(
+        {"ok": False, "error": "A request with this idempotency key is still in progress."},
+        status=409,
+    )
+
+
+def _answer(record, user_id, fingerprint):
+    if record.user_id != user_id or record.fingerprint != fingerprint:
+        return JsonResponse(
+            {"ok": False, "error": "This idempotency key was used for a different request."},
+            status=422,
+        )
+    if record.status_code is None:
+        return _in_progress()
+    return _replay(record)
+
+
+def _take_over(record, user_id, fingerprint):
+    """Claim a matching key whose first request outlived its lease; True if claimed."""
+    if record.status_code is not None or record.user_id != user_id or record.fingerprint != fingerprint:
+        return False
+    now = timezone.now()
+    # renewing created_at restarts the lease; only one retry wins the UPDATE
+    return IdempotencyKey.objects.filter(
+        pk=record.pk,
+        status_code__isnull=True,
+        created_at__lt=now - timedelta(seconds=LEASE_SECONDS),
+    ).update(created_at=now) == 1
+
+
+def idempotent(scope):
+    """Make a POST view replay its first response for a repeated idempotency key."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(KEY_HEADER) or request.POST.get(KEY_FIELD)
+            if not key:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return HttpResponseBadRequest("Idempotency key too long")
+
+            user_id = request.user.pk if request.user.is_authenticated else None
+            fingerprint = _fingerprint(request)
+
+            record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+            if record is None:
+                try:
+                    with transaction.atomic():
+                        record = IdempotencyKey.objects.create(
+                            scope=scope, key=key, user_id=user_id, fingerprint=fingerprint
+                        )
+                except IntegrityError:
+                    # a concurrent request claimed the key first
+                    record = IdempotencyKey.objects.filter(scope=scope, key=key).first()
+                    if record is None:  # ...and has already failed and given it back
+                        return _in_progress()
+                    return _answer(record, user_id, fingerprint)
+            elif not _take_over(record, user_id, fingerprint):
+                return _answer(record, user_id, fingerprint)
+
+            try:
+                response = view(request, *args, **kwargs)
+            except Exception:
+                record.delete()
+                raise
+
+            if response.status_code >= 500 or response.streaming:
+                record.delete()
+                return response
+
+            IdempotencyKey.objects.filter(pk=record.pk).update(
+                status_code=response.status_code,
+                headers={h: response[h] for h in STORED_HEADERS if response.has_header(h)},
+                body=response.content.decode(response.charset),
+            )
+            return response
+
+        return wrapper
+    return decorator
@@ -0,0 +1,129 @@
+# shop/images.py
+"""
+Responsive image derivatives for product imagery.
+
+Every uploaded ShopItem.image / ProductImage.image gets resized WebP copies
+(and AVIF when enabled and the encoder is available) at fixed widths,
+stored next to the media as `derivatives/<name>__w<width>.<ext>`.
+Generation runs in a small background thread pool after the upload is
+committed; `manage.py generate_image_derivatives` backfills existing
+media on a process pool. The `responsive_img` template tag turns an image
+into a <picture> with srcsets for whatever derivatives exist.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+WIDTHS = (160, 320, 640, 960, 1280)
+QUALITY = {"webp": 80, "avif": 60}
+DERIVATIVE_DIR = "derivatives"
+MANIFEST_TIMEOUT = 60 * 60 * 24
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="shop-images")
+
+
+def _avif_available():
+    try:
+        from pillow_heif import register_avif_opener
+        register_avif_opener()
+    except Exception:
+        return False
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+
+def formats():
+    """Derivative formats, best first."""
+    found = ["webp"]
+    if getattr(settings, "SHOP_IMAGE_AVIF", False) and _avif_available():
+        found.insert(0, "avif")
+    return found
+
+
+def derivative_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f"{DERIVATIVE_DIR}/{root}__w{width}.{fmt}"
+
+
+def _manifest_key(name):
+    return f"shop:img:{name}"
+
+
+def available_derivatives(name):
+    """
+    {format: [widths]} of derivatives on storage for an original. Cached,
+    so templates do not stat the storage on every render.
+    """
+    key = _manifest_key(name)
+    manifest = cache.get(key)
+    if manifest is None:
+        manifest = {
+            fmt: [w for w in WIDTHS if default_storage.exists(derivative_name(name, w, fmt))]
+            for fmt in formats()
+        }
+        # look again soon if nothing is there yet (background job may be running)
+        cache.set(key, manifest, MANIFEST_TIMEOUT if any(manifest.values()) else 60 * 5)
+    return manifest
+
+
+def generate_derivatives(name, force=False):
+    """Write the derivatives for one original; returns how many were written."""
+    if not force and any(available_derivatives(name).values()):
+        return 0
+
+    with default_storage.open(name, "rb") as fh:
+        original = ImageOps.exif_transpose(Image.open(fh))
+        original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA" if "A" in original.getbands() else "RGB")
+
+    # never upscale; an original narrower than every width is served as is
+    widths = [w for w in WIDTHS if w <= original.width]
+    written = 0
+    manifest = {}
+    for fmt in formats():
+        manifest[fmt] = []
+        for width in widths:
+            resized = original.resize(
+                (width, max(1, round(original.height * width / original.width))),
+                Image.LANCZOS,
+            )
+            buffer = io.BytesIO()
+            resized.save(buffer, format=fmt.upper(), quality=QUALITY[fmt])
+            target = derivative_name(name, width, fmt)
+            if default_storage.exists(target):
+                default_storage.delete(target)
+            default_storage.save(target, ContentFile(buffer.getvalue()))
+            manifest[fmt].append(width)
+            written += 1
+
+    cache.set(_manifest_key(name), manifest, MANIFEST_TIMEOUT)
+    return written
+
+
+def _generate_for_item(name, item_id):
+    from .signals import catalog_changed
+
+    try:
+        if generate_derivatives(name):
+            # cached cards / 304s still point at the bare original
+            catalog_changed([item_id])
+    except Exception:
+        logger.exception("Could not generate derivatives for %s", name)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(name, item_id):
+    """Generate derivatives in the background once the upload is committed."""
+    transaction.on_commit(lambda: _executor.submit(_generate_for_item, name, item_id))
@@ -0,0 +1,133 @@
+# shop/inventory.py
+"""
+Per-unit stock and checkout reservations.
+
+Stock is taken with a single conditional UPDATE per unit
+(stock = stock - qty WHERE stock >= qty), so concurrent checkouts only
+contend on the rows of the SKUs they share and can never drive stock
+below zero. Units with stock = NULL are not tracked and always succeed.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import ProductUnit, StockReservation
+from .signals import catalog_changed
+
+RESERVATION_MINUTES = getattr(settings, "SHOP_RESERVATION_MINUTES", 15)
+RELEASE_CHUNK_SIZE = 500
+
+
+class OutOfStock(Exception):
+    def __init__(self, units):
+        self.units = units  # ProductUnit rows that could not be reserved
+        labels = ", ".join(str(u) for u in units)
+        super().__init__(f"Not enough stock for: {labels}")
+
+
+def take_stock(unit_id, qty):
+    """Atomically remove qty from a unit. Returns False if there is not enough."""
+    return bool(
+        ProductUnit.objects.filter(pk=unit_id, stock__gte=qty).update(stock=F("stock") - qty)
+    )
+
+
+def adjust_stock(unit_id, change):
+    """
+    Add `change` (negative to remove) to a unit's stock in one UPDATE,
+    never going below zero, so concurrent checkouts aren't written over.
+    An untracked unit starts being tracked at max(change, 0).
+    """
+    if not change:
+        return
+    if not ProductUnit.objects.filter(pk=unit_id, stock__isnull=False).update(
+        stock=Greatest(F("stock") + change, 0)
+    ):
+        ProductUnit.objects.filter(pk=unit_id, stock__isnull=True).update(stock=max(change, 0))
+
+
+def _return_stock(quantities):
+    """Put {unit_id: qty} back, refreshing listings of units that were sold out."""
+    if not quantities:
+        return
+    sold_out = set(
+        ProductUnit.objects.filter(pk__in=quantities, stock=0).values_list("product_id", flat=True)
+    )
+    for unit_id, qty in sorted(quantities.items()):
+        ProductUnit.objects.filter(pk=unit_id, stock__isnull=False).update(stock=F("stock") + qty)
+    if sold_out:
+        catalog_changed(sold_out)
+
+
+def reserve_cart(cart):
+    """
+    Hold stock for every tracked unit in the cart until the reservation
+    expires. Re-entering checkout replaces the cart's previous holds.
+    Raises OutOfStock (and takes nothing) if any unit is short.
+    """
+    expires_at = timezone.now() + timedelta(minutes=RESERVATION_MINUTES)
+    wanted = defaultdict(int)
+    for unit_id, qty in cart.items.filter(
+        product_unit__stock__isnull=False
+    ).values_list("product_unit_id", "qty"):
+        wanted[unit_id] += qty
+
+    with transaction.atomic():
+        held = dict(
+            StockReservation.objects.select_for_update()
+            .filter(cart=cart)
+            .values_list("product_unit_id", "qty")
+        )
+        _return_stock(held)
+        StockReservation.objects.filter(cart=cart).delete()
+
+        # lock rows in a fixed order so two carts can't deadlock each other
+        short = [unit_id for unit_id in sorted(wanted) if not take_stock(unit_id, wanted[unit_id])]
+        if short:
+            # raising out of the atomic block rolls back what was taken
+            raise OutOfStock(list(ProductUnit.objects.filter(pk__in=short).select_related("product")))
+
+        StockReservation.objects.bulk_create(
+            StockReservation(cart=cart, product_unit_id=unit_id, qty=qty, expires_at=expires_at)
+            for unit_id, qty in wanted.items()
+        )
+        sold_out = ProductUnit.objects.filter(pk__in=wanted, stock=0).values_list("product_id", flat=True)
+        if sold_out:
+            catalog_changed(sold_out)
+
+    return expires_at
+
+
+def release_cart(cart):
+    """Give back everything the cart is holding."""
+    with transaction.atomic():
+        held = StockReservation.objects.select_for_update().filter(cart=cart)
+        _return_stock(dict(held.values_list("product_unit_id", "qty")))
+        held.delete()
+
+
+def release_expired(now=None, chunk_size=RELEASE_CHUNK_SIZE):
+    """Return stock held by expired reservations, a chunk per transaction. Returns the count."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now)
+                .order_by("pk")
+                .values_list("pk", "product_unit_id", "qty")[:chunk_size]
+            )
+            if not chunk:
+                return released
+            quantities = defaultdict(int)
+            for _pk, unit_id, qty in chunk:
+                quantities[unit_id] += qty
+            _return_stock(quantities)
+            StockReservation.objects.filter(pk__in=[row[0] for row in chunk]).delete()
+        released += len(chunk)
@@ -0,0 +1,194 @@
+# shop/listing.py
+from datetime import datetime
+
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.text import Truncator
+
+from .models import ShopItem, ShopItemListing, ProductUnit
+
+EXCERPT_WORDS = 20
+REBUILD_CHUNK_SIZE = 500
+
+LISTING_UPDATE_FIELDS = [
+    "title",
+    "slug",
+    "excerpt",
+    "category_slug",
+    "category_name",
+    "is_experience",
+    "in_stock",
+    "price",
+    "default_unit_id",
+    "default_unit_label",
+    "units",
+    "image_url",
+    "created_at",
+    "updated_at",
+]
+
+
+def active_units_prefetch():
+    """Prefetch active units onto `item.prefetched_active_units`, default first."""
+    return Prefetch(
+        "units",
+        queryset=(
+            ProductUnit.objects.filter(is_active=True)
+            .select_related("unit_type")
+            .order_by("-is_default", "id")
+        ),
+        to_attr="prefetched_active_units",
+    )
+
+
+def listing_queryset(queryset=None):
+    """
+    Items ready for the shop listing: category joined in and active units
+    prefetched, so a whole page renders in two queries however many cards
+    it has.
+    """
+    if queryset is None:
+        queryset = ShopItem.objects.filter(published=True)
+    return queryset.select_related("category").prefetch_related(active_units_prefetch())
+
+
+def prefetch_detail(item):
+    """Load what the product page shows (active units, gallery) onto `item`."""
+    prefetch_related_objects([item], active_units_prefetch(), "gallery_images")
+    return item
+
+
+# ============================================================
+# LISTING SNAPSHOT (ShopItemListing)
+# ============================================================
+
+def _image_url(item):
+    if item.image:
+        return item.image.url
+    gallery = item.gallery_images.all()
+    return gallery[0].image.url if gallery else ""
+
+
+def build_listing(item):
+    """Return an unsaved ShopItemListing row for an item loaded via listing_queryset."""
+    default = item.default_unit()
+    units = item.active_units()
+    return ShopItemListing(
+        item=item,
+        title=item.title,
+        slug=item.slug,
+        excerpt=Truncator(strip_tags(item.description)).words(EXCERPT_WORDS, truncate=" …"),
+        category_slug=item.category.slug,
+        category_name=item.category.name,
+        is_experience=item.is_experience,
+        in_stock=item.is_experience or (
+            any(u.in_stock for u in units) if units else item.price is not None
+        ),
+        price=item.effective_price(),
+        default_unit_id=default.id if default else None,
+        default_unit_label=default.label if default else "",
+        units=[
+            {
+                "id": u.id,
+                "label": u.label,
+                "price": str(u.price),
+                "is_default": u.is_default,
+                "unit_type": u.unit_type.code,
+            }
+            for u in units
+        ],
+        image_url=_image_url(item),
+        created_at=item.created_at,
+    )
+
+
+def refresh_listings(item_ids):
+    """
+    Bring the snapshot rows for `item_ids` in line with the catalogue:
+    upsert rows for published items, drop rows for everything else.
+    """
+    item_ids = set(item_ids)
+    if not item_ids:
+        return
+
+    items = listing_queryset(
+        ShopItem.objects.filter(pk__in=item_ids, published=True)
+    ).prefetch_related("gallery_images")
+    rows = [build_listing(item) for item in items]
+
+    ShopItemListing.objects.filter(pk__in=item_ids - {row.item_id for row in rows}).delete()
+    if rows:
+        ShopItemListing.objects.bulk_create(
+            rows,
+            update_conflicts=True,
+            unique_fields=["item"],
+            update_fields=LISTING_UPDATE_FIELDS,
+        )
+
+
+def refresh_category_listings(category):
+    """Category renames only touch two columns, so update them in place."""
+    ShopItemListing.objects.filter(item__category=category).update(
+        category_slug=category.slug,
+        category_name=category.name,
+        updated_at=timezone.now(),  # the cards' fragment version
+    )
+
+
+def rebuild_listings(chunk_size=REBUILD_CHUNK_SIZE):
+    """Recreate the whole snapshot table. Returns the number of rows written."""
+    ids = list(
+        ShopItem.objects.filter(published=True).order_by("pk").values_list("pk", flat=True)
+    )
+    ShopItemListing.objects.exclude(pk__in=ShopItem.objects.filter(published=True)).delete()
+    for start in range(0, len(ids), chunk_size):
+        refresh_listings(ids[start:start + chunk_size])
+    return len(ids)
+
+
+# ============================================================
+# KEYSET PAGINATION
+# ============================================================
+# Pages are cut on (created_at, item_id) — the listing's own ordering and
+# index — so a page costs the same at the top of the catalogue as at the
+# bottom, and there is no COUNT query.
+
+PAGE_SIZE = 12
+
+
+def encode_cursor(row):
+    raw = f"{row.created_at.isoformat()}|{row.item_id}"
+    return urlsafe_base64_encode(raw.encode())
+
+
+def decode_cursor(cursor):
+    """Return (created_at, item_id), or None for a missing/garbled cursor."""
+    if not cursor:
+        return None
+    try:
+        created_raw, item_raw = urlsafe_base64_decode(cursor).decode().split("|", 1)
+        created_at = datetime.fromisoformat(created_raw)
+        return created_at, int(item_raw)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def listing_page(queryset, cursor=None, page_size=PAGE_SIZE):
+    """
+    Slice one page off an ordered ShopItemListing queryset.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, item_id = position
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, item_id__lt=item_id)
+        )
+
+    rows = list(queryset.order_by("-created_at", "-item_id")[:page_size + 1])
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1])
+    return rows, None
@@ -0,0 +1,81 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from shop.models import Cart, CartItem, Order, ShopItem, ProductUnit
+from shop.orders import place_order
+from shop.pricing import refresh_cart_totals, unit_price_for
+
+BENCH_USERNAME = "benchmark-checkout"
+
+
+class Command(BaseCommand):
+    help = (
+        "Place orders from synthetic carts of growing size and report queries and "
+        "timings. Uses (and afterwards deletes) a throwaway user and its orders; "
+        "only units without stock tracking are used, so stock is never touched."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,10,100", help="Comma separated line counts")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        catalog = [
+            (product, None)
+            for product in ShopItem.objects.filter(published=True, price__isnull=False)
+        ]
+        catalog += [
+            (unit.product, unit)
+            for unit in ProductUnit.objects.filter(
+                is_active=True, stock__isnull=True, product__published=True
+            ).select_related("product")
+        ]
+        if not catalog:
+            raise CommandError("No published products to order; seed the shop first.")
+
+        user, _ = get_user_model().objects.get_or_create(username=BENCH_USERNAME)
+        cart, _ = Cart.objects.get_or_create(user=user)
+        try:
+            for size in [int(s) for s in options["sizes"].split(",")]:
+                if size > len(catalog):
+                    self.stdout.write(f"{size:>6} lines: skipped, catalogue has {len(catalog)} lines")
+                    continue
+                counts, timings = set(), []
+                for _ in range(options["repeat"]):
+                    self._fill(cart, catalog[:size])
+                    expected = cart.total()
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.perf_counter()
+                        order = place_order(cart, user)
+                        timings.append(time.perf_counter() - started)
+                    counts.add(
+                        len([q for q in queries.captured_queries if q["sql"] not in ("BEGIN", "COMMIT")])
+                    )
+                    if order.total != expected or order.items.count() != size:
+                        raise CommandError(f"{order} does not match its cart ({order.total} != {expected})")
+
+                self.stdout.write(
+                    f"{size:>6} lines: {'/'.join(map(str, sorted(counts)))} queries, "
+                    f"{min(timings) * 1000:.2f} ms per order"
+                )
+        finally:
+            Order.objects.filter(user=user).delete()
+            user.delete()
+
+    def _fill(self, cart, lines):
+        CartItem.objects.filter(cart=cart).delete()
+        CartItem.objects.bulk_create(
+            CartItem(
+                cart=cart,
+                product=product,
+                product_unit=unit,
+                qty=1 + i % 3,
+                unit_price=unit_price_for(product, unit),
+            )
+            for i, (product, unit) in enumerate(lines)
+        )
+        refresh_cart_totals(cart)
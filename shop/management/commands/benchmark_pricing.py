@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from shop.models import ShopItem, ProductUnit
+from shop.pricing import PriceBook, PriceLine
+
+
+class Command(BaseCommand):
+    help = "Price synthetic carts through the PriceBook and report queries and timings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,10,100,1000", help="Comma separated line counts")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        catalog = [
+            PriceLine(pid, None, 1)
+            for pid in ShopItem.objects.filter(published=True).values_list("pk", flat=True)
+        ]
+        catalog += [
+            PriceLine(product_id, pk, 1)
+            for pk, product_id in ProductUnit.objects.filter(
+                is_active=True, product__published=True
+            ).values_list("pk", "product_id")
+        ]
+        if not catalog:
+            raise CommandError("No published products to price; seed the shop first.")
+
+        for size in [int(s) for s in options["sizes"].split(",")]:
+            lines = [catalog[i % len(catalog)]._replace(qty=1 + i % 5) for i in range(size)]
+
+            with CaptureQueriesContext(connection) as queries:
+                PriceBook.load(lines).price(lines)
+
+            started = time.perf_counter()
+            for _ in range(options["repeat"]):
+                PriceBook.load(lines).price(lines)
+            elapsed = (time.perf_counter() - started) / options["repeat"]
+
+            self.stdout.write(
+                f"{size:>6} lines: {len(queries.captured_queries)} queries, "
+                f"{elapsed * 1000:.2f} ms per cart"
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from shop.recommendations import build_recommendations, TOP_N
+
+
+class Command(BaseCommand):
+    help = "Fold new orders (and open carts) into the 'frequently bought together' tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Recount every order and rebuild every item's recommendations",
+        )
+        parser.add_argument("--top", type=int, default=TOP_N)
+
+    def handle(self, *args, **options):
+        changed = build_recommendations(full=options["full"], top_n=options["top"])
+        self.stdout.write(self.style.SUCCESS(f"Updated recommendations for {changed} items."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from shop.catalog_io import BATCH_SIZE, SHEETS, export_catalog
+
+
+class Command(BaseCommand):
+    help = "Export categories, items, units and images to a CSV directory or .xlsx workbook"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Directory for <sheet>.csv files, or an .xlsx filename")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        counts = export_catalog(options["path"], chunk_size=options["batch_size"])
+        summary = ", ".join(f"{counts[sheet]} {sheet}" for sheet in SHEETS)
+        self.stdout.write(self.style.SUCCESS(f"Exported {summary}."))
@@ -0,0 +1,65 @@
+import os
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from shop.images import generate_derivatives
+from shop.models import ShopItem, ProductImage
+from shop.signals import catalog_changed
+
+CHUNK_SIZE = 500
+
+
+def _generate(name, force):
+    try:
+        return name, generate_derivatives(name, force=force), None
+    except Exception as exc:  # reported by the parent
+        return name, 0, str(exc)
+
+
+class Command(BaseCommand):
+    help = "Backfill WebP/AVIF derivatives for all shop and gallery images"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+        parser.add_argument("--force", action="store_true", help="Regenerate existing derivatives")
+
+    def handle(self, *args, **options):
+        # image name -> the items showing it
+        owners = defaultdict(set)
+        for pk, name in (
+            ShopItem.objects.exclude(image="").exclude(image__isnull=True).values_list("pk", "image")
+        ):
+            owners[name].add(pk)
+        for product_id, name in ProductImage.objects.exclude(image="").values_list("product_id", "image"):
+            owners[name].add(product_id)
+        names = set(owners)
+
+        # forked workers must not share the parent's DB connection
+        connections.close_all()
+
+        written = failed = 0
+        changed = set()
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [pool.submit(_generate, name, options["force"]) for name in sorted(names)]
+            for future in as_completed(futures):
+                name, count, error = future.result()
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                else:
+                    written += count
+                    if count:
+                        changed |= owners[name]
+
+        # cards and product pages (and their 304s) still carry the bare
+        # originals: bump updated_at and refresh them, as the upload path does
+        changed = sorted(changed)
+        for start in range(0, len(changed), CHUNK_SIZE):
+            catalog_changed(changed[start:start + CHUNK_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(names)} images processed, {written} derivatives written, {failed} failed."
+        ))
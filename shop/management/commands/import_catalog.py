@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.catalog_io import BATCH_SIZE, SHEETS, CatalogError, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = "Import categories, items, units and images from a CSV directory or .xlsx workbook"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Directory of <sheet>.csv files, or an .xlsx workbook")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would change and roll everything back",
+        )
+
+    def handle(self, *args, **options):
+        importer = CatalogImporter(batch_size=options["batch_size"], dry_run=options["dry_run"])
+        try:
+            stats = importer.run(options["path"])
+        except CatalogError as exc:
+            raise CommandError(str(exc))
+
+        for sheet in SHEETS:
+            counts = stats[sheet]
+            self.stdout.write(
+                f"{sheet}: {counts['created']} created, {counts['updated']} updated, "
+                f"{counts['unchanged']} unchanged"
+            )
+        if options["dry_run"]:
+            self.stdout.write(self.style.WARNING("Dry run - nothing was saved."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Catalogue imported."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.listing import rebuild_listings, REBUILD_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Rebuild the ShopItemListing snapshot table from the catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        count = rebuild_listings(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} listing rows."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from shop.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the shop full-text search index (SQLite FTS5 only)"
+
+    def handle(self, *args, **options):
+        rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
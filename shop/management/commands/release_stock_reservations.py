@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from shop.inventory import release_expired, RELEASE_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = "Return stock held by expired checkout reservations (run from cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=RELEASE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        count = release_expired(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(f"Released {count} expired reservations."))
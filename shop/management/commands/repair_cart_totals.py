@@ -0,0 +1,36 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from shop.models import Cart
+from shop.pricing import recompute_cart_totals, stored_totals_subqueries
+
+CHUNK_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = "Recompute Cart.item_count / subtotal / tax_total from the cart items"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report carts that are off")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        live = stored_totals_subqueries()
+        stale = (
+            Cart.objects.annotate(**{f"live_{name}": expr for name, expr in live.items()})
+            .filter(reduce(or_, (~Q(**{name: F(f"live_{name}")}) for name in live)))
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        pks = list(stale)
+        self.stdout.write(f"{len(pks)} carts have stale totals.")
+        if options["dry_run"] or not pks:
+            return
+
+        size = options["chunk_size"]
+        for start in range(0, len(pks), size):
+            recompute_cart_totals(Cart.objects.filter(pk__in=pks[start:start + size]))
+        self.stdout.write(self.style.SUCCESS(f"Repaired {len(pks)} carts."))
@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from shop.cart_count import forget_cart_counts
+from shop.idempotency import KEY_TTL_HOURS
+from shop.models import Cart, CartItem, IdempotencyKey, StockReservation
+
+DB_SESSION_ENGINES = (
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete abandoned carts, expired sessions and idempotency keys in small "
+        "keyed batches, one short transaction each. Safe to run every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="Carts untouched for this long are abandoned")
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--pause", type=float, default=0.05, help="Seconds to sleep between batches")
+        parser.add_argument("--time-limit", type=float, default=60, help="Stop after this many seconds")
+
+    def handle(self, *args, **options):
+        self.batch_size = options["batch_size"]
+        self.pause = options["pause"]
+        self.deadline = time.monotonic() + options["time_limit"]
+
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        self._report("carts", self._sweep(self._cart_batch, cutoff))
+
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            self._report("sessions", self._sweep(self._session_batch, timezone.now()))
+
+        key_cutoff = timezone.now() - timedelta(hours=KEY_TTL_HOURS)
+        self._report("idempotency keys", self._sweep(self._key_batch, key_cutoff))
+
+    def _sweep(self, delete_batch, cutoff):
+        deleted, started = 0, time.monotonic()
+        while time.monotonic() < self.deadline:
+            count = delete_batch(cutoff)
+            deleted += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return deleted, time.monotonic() - started
+
+    def _cart_batch(self, cutoff):
+        with transaction.atomic():
+            rows = list(
+                Cart.objects.select_for_update(skip_locked=True)
+                # carts still holding stock wait for release_stock_reservations;
+                # NOT EXISTS, as FOR UPDATE can't lock the nullable side of a join
+                .filter(updated_at__lt=cutoff)
+                .filter(~Exists(StockReservation.objects.filter(cart=OuterRef("pk"))))
+                .order_by("pk")
+                .values_list("pk", "user_id")[: self.batch_size]
+            )
+            if not rows:
+                return 0
+            pks = [pk for pk, _user_id in rows]
+            CartItem.objects.filter(cart_id__in=pks).delete()
+            Cart.objects.filter(pk__in=pks).delete()
+            forget_cart_counts(user_id for _pk, user_id in rows)
+        return len(rows)
+
+    def _session_batch(self, cutoff):
+        with transaction.atomic():
+            keys = list(
+                Session.objects.filter(expire_date__lt=cutoff)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: self.batch_size]
+            )
+            if keys:
+                Session.objects.filter(pk__in=keys).delete()
+        return len(keys)
+
+    def _key_batch(self, cutoff):
+        with transaction.atomic():
+            pks = list(
+                IdempotencyKey.objects.filter(created_at__lt=cutoff)
+                .order_by("pk")
+                .values_list("pk", flat=True)[: self.batch_size]
+            )
+            if pks:
+                IdempotencyKey.objects.filter(pk__in=pks).delete()
+        return len(pks)
+
+    def _report(self, label, result):
+        deleted, elapsed = result
+        rate = deleted / elapsed if elapsed else 0
+        self.stdout.write(f"{label}: deleted {deleted} in {elapsed:.2f}s ({rate:.0f}/s)")
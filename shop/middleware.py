@@ -0,0 +1,33 @@
+# shop/middleware.py
+from django.conf import settings
+
+
+class AnonCartCookieMiddleware:
+    """
+    Writes the guest cart cookie when cart_utils changed it during the
+    request (SHOP_ANON_CART_STORAGE = "cookie"); a no-op otherwise.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if not getattr(request, "_shop_cart_dirty", False):
+            return response
+
+        from .cart_utils import encode_cart_cookie
+
+        name = settings.SHOP_CART_COOKIE_NAME
+        if request._shop_cart:
+            response.set_cookie(
+                name,
+                encode_cart_cookie(request._shop_cart),
+                max_age=settings.SHOP_CART_COOKIE_AGE,
+                secure=settings.SESSION_COOKIE_SECURE or None,
+                httponly=True,
+                samesite=settings.SESSION_COOKIE_SAMESITE,
+            )
+        else:
+            response.delete_cookie(name, samesite=settings.SESSION_COOKIE_SAMESITE)
+        return response
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-18 18:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopItemListing',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='listing', serialize=False, to='shop.shopitem')),
+                ('title', models.CharField(max_length=255)),
+                ('slug', models.SlugField(max_length=255)),
+                ('excerpt', models.TextField(blank=True)),
+                ('category_slug', models.SlugField(max_length=140)),
+                ('category_name', models.CharField(max_length=120)),
+                ('is_experience', models.BooleanField(default=False)),
+                ('price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('default_unit_id', models.BigIntegerField(blank=True, null=True)),
+                ('default_unit_label', models.CharField(blank=True, max_length=50)),
+                ('units', models.JSONField(blank=True, default=list)),
+                ('image_url', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ('-created_at', '-item'),
+                'indexes': [models.Index(fields=['-created_at', '-item'], name='shop_shopit_created_5f46ad_idx'), models.Index(fields=['category_slug', '-created_at'], name='shop_shopit_categor_dabaa1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+from django.db import migrations
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+
+
+def populate_listings(apps, schema_editor):
+    ShopItem = apps.get_model("shop", "ShopItem")
+    ShopItemListing = apps.get_model("shop", "ShopItemListing")
+
+    rows = []
+    items = (
+        ShopItem.objects.filter(published=True)
+        .select_related("category")
+        .prefetch_related("units__unit_type", "gallery_images")
+    )
+    for item in items:
+        units = sorted(
+            (u for u in item.units.all() if u.is_active),
+            key=lambda u: (not u.is_default, u.id),
+        )
+        default = next((u for u in units if u.is_default), None)
+        gallery = sorted(item.gallery_images.all(), key=lambda g: g.order)
+        if item.image:
+            image_url = item.image.url
+        else:
+            image_url = gallery[0].image.url if gallery else ""
+
+        rows.append(
+            ShopItemListing(
+                item=item,
+                title=item.title,
+                slug=item.slug,
+                excerpt=Truncator(strip_tags(item.description)).words(20, truncate=" …"),
+                category_slug=item.category.slug,
+                category_name=item.category.name,
+                is_experience=item.is_experience,
+                price=default.price if default else item.price,
+                default_unit_id=default.id if default else None,
+                default_unit_label=default.label if default else "",
+                units=[
+                    {
+                        "id": u.id,
+                        "label": u.label,
+                        "price": str(u.price),
+                        "is_default": u.is_default,
+                        "unit_type": u.unit_type.code,
+                    }
+                    for u in units
+                ],
+                image_url=image_url,
+                created_at=item.created_at,
+            )
+        )
+    ShopItemListing.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0002_shopitemlisting"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE shop_shopitem_fts USING fts5("
+    "title, description, tokenize = 'unicode61 remove_diacritics 2')",
+    "INSERT INTO shop_shopitem_fts (rowid, title, description) "
+    "SELECT id, title, description FROM shop_shopitem",
+]
+SQLITE_BACKWARD = [
+    "DROP TABLE IF EXISTS shop_shopitem_fts",
+]
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE shop_shopitem ADD COLUMN search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX shop_shopitem_search_vector_gin "
+    "ON shop_shopitem USING GIN (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS shop_shopitem_search_vector_gin",
+    "ALTER TABLE shop_shopitem DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shop", "0003_populate_shopitemlisting"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({"sqlite": SQLITE_FORWARD, "postgresql": POSTGRES_FORWARD}),
+            _run({"sqlite": SQLITE_BACKWARD, "postgresql": POSTGRES_BACKWARD}),
+        ),
+    ]
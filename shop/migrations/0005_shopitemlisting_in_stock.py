@@ -0,0 +1,35 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:03
+
+from django.db import migrations, models
+
+
+def mark_unpurchasable(apps, schema_editor):
+    ShopItemListing = apps.get_model("shop", "ShopItemListing")
+    ids = [
+        pk
+        for pk, units in ShopItemListing.objects.filter(
+            is_experience=False, price__isnull=True
+        ).values_list("pk", "units")
+        if not units
+    ]
+    ShopItemListing.objects.filter(pk__in=ids).update(in_stock=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_shopitem_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopitemlisting',
+            name='in_stock',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='shopitemlisting',
+            index=models.Index(fields=['price'], name='shop_shopit_price_266b6a_idx'),
+        ),
+        migrations.RunPython(mark_unpurchasable, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_shopitemlisting_in_stock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopitem',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:16
+
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import migrations, models
+
+
+def fill_cart_totals(apps, schema_editor):
+    Cart = apps.get_model("shop", "Cart")
+    CartItem = apps.get_model("shop", "CartItem")
+    cent = Decimal("0.01")
+
+    totals = {}
+    for cart_id, qty, unit_price, tax_percent in CartItem.objects.values_list(
+        "cart_id", "qty", "unit_price", "product__tax_percent"
+    ).iterator():
+        count, subtotal, tax = totals.get(cart_id, (0, Decimal("0.00"), Decimal("0.00")))
+        line_total = (unit_price or Decimal("0.00")) * qty
+        line_tax = (line_total * (tax_percent or 0) / 100).quantize(cent, rounding=ROUND_HALF_UP)
+        totals[cart_id] = (count + qty, subtotal + line_total, tax + line_tax)
+
+    for cart_id, (count, subtotal, tax) in totals.items():
+        Cart.objects.filter(pk=cart_id).update(item_count=count, subtotal=subtotal, tax_total=tax)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='tax_total',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12),
+        ),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:19
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    """
+    Fold duplicate (cart, product, unit) lines into the oldest one. The
+    quantities add up, so Cart.item_count is unchanged; if the duplicates
+    carried different unit prices, `manage.py repair_cart_totals` afterwards.
+    """
+    CartItem = apps.get_model("shop", "CartItem")
+
+    duplicates = (
+        CartItem.objects.values("cart_id", "product_id", "product_unit_id")
+        .annotate(n=Count("id"), keep=Min("id"), qty_sum=Sum("qty"))
+        .filter(n__gt=1)
+    )
+    for dup in duplicates:
+        lines = CartItem.objects.filter(
+            cart_id=dup["cart_id"],
+            product_id=dup["product_id"],
+            product_unit_id=dup["product_unit_id"],
+        )
+        lines.exclude(pk=dup["keep"]).delete()
+        lines.filter(pk=dup["keep"]).update(qty=dup["qty_sum"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_cart_totals'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='cartitem',
+            unique_together=set(),
+        ),
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('product_unit__isnull', False)), fields=('cart', 'product', 'product_unit'), name='shop_cartitem_unique_unit_line'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('product_unit__isnull', True)), fields=('cart', 'product'), name='shop_cartitem_unique_plain_line'),
+        ),
+    ]
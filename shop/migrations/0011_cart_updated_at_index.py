@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_cartitem_partial_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['updated_at'], name='shop_cart_updated_b4c123_idx'),
+        ),
+    ]
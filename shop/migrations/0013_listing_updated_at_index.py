@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shopitemlisting',
+            index=models.Index(fields=['updated_at'], name='shop_shopit_updated_efdd7a_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 20:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_listing_updated_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recommendationcheckpoint',
+            name='last_cart_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -43,6 +43,7 @@ class ShopItem(models.Model):
     is_experience = models.BooleanField(default=False)
     image = models.ImageField(upload_to="shop/", blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     published = models.BooleanField(default=True)
 
     class Meta:
@@ -60,19 +61,120 @@ class ShopItem(models.Model):
         return self.title
 
     # ---- helpers used in templates ----
+    # When the item was loaded through shop.listing, the active units are
+    # already on `prefetched_active_units` (ordered default first) and these
+    # helpers answer from memory instead of querying ProductUnit per call.
     def has_units(self):
+        if hasattr(self, "prefetched_active_units"):
+            return bool(self.prefetched_active_units)
         return self.units.filter(is_active=True).exists()
 
     def active_units(self):
+        if hasattr(self, "prefetched_active_units"):
+            return self.prefetched_active_units
         return self.units.filter(is_active=True).order_by("-is_default", "id")
 
     def default_unit(self):
+        if hasattr(self, "prefetched_active_units"):
+            for unit in self.prefetched_active_units:
+                if unit.is_default:
+                    return unit
+            return None
         return self.units.filter(is_active=True, is_default=True).first()
 
+    def effective_price(self):
+        unit = self.default_unit()
+        return unit.price if unit else self.price
+
+    def price_display(self):
+        return f"₹ {self.price:.2f}" if self.price else ""
+
+
+# ---------------------------
+# Listing snapshot (read model)
+# ---------------------------
+class ShopItemListing(models.Model):
+    """
+    One denormalized row per published ShopItem, holding everything a shop
+    listing card shows. Maintained by shop.listing / shop.signals; never edit
+    by hand (`manage.py rebuild_listings` recreates the table).
+    """
+    item = models.OneToOneField(
+        ShopItem,
+        primary_key=True,
+        related_name="listing",
+        on_delete=models.CASCADE,
+    )
+    title = models.CharField(max_length=255)
+    slug = models.SlugField(max_length=255)
+    excerpt = models.TextField(blank=True)
+    category_slug = models.SlugField(max_length=140)
+    category_name = models.CharField(max_length=120)
+    is_experience = models.BooleanField(default=False)
+    in_stock = models.BooleanField(default=True)
+    price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    default_unit_id = models.BigIntegerField(null=True, blank=True)
+    default_unit_label = models.CharField(max_length=50, blank=True)
+    units = models.JSONField(default=list, blank=True)
+    image_url = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ("-created_at", "-item")
+        indexes = [
+            models.Index(fields=["-created_at", "-item"]),
+            models.Index(fields=["category_slug", "-created_at"]),
+            models.Index(fields=["price"]),
+            models.Index(fields=["updated_at"]),  # facet_version
+        ]
+
+    def __str__(self):
+        return self.title
+
+    def has_units(self):
+        return bool(self.units)
+
     def price_display(self):
         return f"₹ {self.price:.2f}" if self.price else ""
 
 
+# ---------------------------
+# "Frequently bought together" (maintained by build_recommendations)
+# ---------------------------
+class ShopItemCooccurrence(models.Model):
+    """Number of orders containing both items; one row per pair, item_id < related_id."""
+    item = models.ForeignKey(ShopItem, on_delete=models.CASCADE, related_name="+")
+    related = models.ForeignKey(ShopItem, on_delete=models.CASCADE, related_name="+")
+    orders = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("item", "related")
+        indexes = [models.Index(fields=["related"])]
+
+
+class ShopItemRecommendation(models.Model):
+    """The top-N related items per product, ready to render."""
+    item = models.ForeignKey(ShopItem, on_delete=models.CASCADE, related_name="recommendations")
+    related = models.ForeignKey(ShopItem, on_delete=models.CASCADE, related_name="recommended_in")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ("item", "rank")
+        unique_together = ("item", "rank")
+
+
+class RecommendationCheckpoint(models.Model):
+    """
+    Single row: the last Order folded into ShopItemCooccurrence, and when
+    carts were last scanned.
+    """
+    last_order_id = models.BigIntegerField(default=0)
+    last_cart_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
 # ---------------------------
 # Product Gallery Images
 # ---------------------------
@@ -115,6 +217,8 @@ class ProductUnit(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_default = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    # None = stock not tracked for this unit
+    stock = models.PositiveIntegerField(null=True, blank=True)
 
     def save(self, *args, **kwargs):
         if self.is_default:
@@ -124,6 +228,10 @@ class ProductUnit(models.Model):
     def __str__(self):
         return f"{self.product} – {self.label}"
 
+    @property
+    def in_stock(self):
+        return self.stock is None or self.stock > 0
+
 
 # ---------------------------
 # LEGACY Product Type (DO NOT DELETE)
@@ -154,26 +262,37 @@ class Cart(models.Model):
     )
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Stored totals, rewritten in the same transaction as every CartItem
+    # change (cart_utils / pricing.refresh_cart_totals); repair_cart_totals
+    # recomputes them from the items.
+    item_count = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+    tax_total = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0.00"))
+
     class Meta:
         ordering = ("-updated_at",)
+        indexes = [models.Index(fields=["updated_at"])]  # sweep_carts
 
     def __str__(self):
         return f"Cart({self.user})" if self.user else "Cart(anonymous)"
 
-    def items_count(self):
-        return sum(item.qty for item in self.items.all())
+    def priced(self):
+        from .pricing import price_cart
+        return price_cart(self)
+
+    def summary(self):
+        """Live counts and totals from the items, in one aggregate query."""
+        from .pricing import cart_summary
+        return cart_summary(self.pk)
 
-    def subtotal(self):
-        return sum(item.line_total() for item in self.items.all())
+    def items_count(self):
+        return self.item_count
 
     def total_tax(self):
-        return sum(
-            item.line_total() * (item.tax_percent / Decimal("100"))
-            for item in self.items.all()
-        )
+        return self.tax_total
 
     def total(self):
-        return self.subtotal() + self.total_tax()
+        return self.subtotal + self.tax_total
 
 
 class CartItem(models.Model):
@@ -186,7 +305,20 @@ class CartItem(models.Model):
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
 
     class Meta:
-        unique_together = ("cart", "product", "product_unit")
+        # NULLs never collide in a plain unique index, so unit-less lines
+        # get their own partial constraint; cart_utils upserts against these.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "product", "product_unit"],
+                condition=models.Q(product_unit__isnull=False),
+                name="shop_cartitem_unique_unit_line",
+            ),
+            models.UniqueConstraint(
+                fields=["cart", "product"],
+                condition=models.Q(product_unit__isnull=True),
+                name="shop_cartitem_unique_plain_line",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.qty} × {self.product}"
@@ -199,6 +331,30 @@ class CartItem(models.Model):
         return self.product.tax_percent if self.product else Decimal("0.00")
 
 
+# ---------------------------
+# Stock reservations
+# ---------------------------
+class StockReservation(models.Model):
+    """
+    Units held for a cart while it checks out. The stock has already been
+    taken off ProductUnit.stock; it goes back when the reservation expires
+    (release_stock_reservations) and is kept when the order is placed.
+    """
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="reservations")
+    product_unit = models.ForeignKey(
+        ProductUnit, on_delete=models.CASCADE, related_name="reservations"
+    )
+    qty = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        unique_together = ("cart", "product_unit")
+
+    def __str__(self):
+        return f"{self.qty} × {self.product_unit} for {self.cart}"
+
+
 # ---------------------------
 # Experience Bookings
 # ---------------------------
@@ -299,3 +455,31 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.qty} × {self.title}"
+
+
+# ---------------------------
+# Idempotency keys
+# ---------------------------
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied key for one POST to a write endpoint and the response
+    it produced, so a retried request is answered from here instead of
+    placing the order (or booking) twice. status_code is NULL while the
+    first request is still running.
+    """
+    scope = models.CharField(max_length=64)
+    key = models.CharField(max_length=255)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    headers = models.JSONField(default=dict, blank=True)
+    body = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="shop_idempotencykey_unique_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
@@ -0,0 +1,155 @@
+# shop/orders.py
+"""
+Cart -> Order conversion.
+
+place_order() does the whole checkout in one transaction with a fixed
+number of queries however many lines the cart has: lock the cart, price
+it in one pass (price_cart), bulk_create the OrderItems with the title,
+unit price and tax rate snapshotted, let SQL sum the order totals from
+those rows (rounding tax per line exactly like the PriceBook), turn the
+cart's stock reservations into the sale and empty the cart.
+
+Tracked units the cart is not validly holding (checkout page skipped,
+or the hold expired or was swept) are reserved on the spot, so an order can
+never oversell. Lines whose product was unpublished or whose unit was
+deactivated since they were added stop the order (Unavailable); the
+checkout page clears them out first with drop_unavailable().
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .models import CartItem, Order, OrderItem, StockReservation
+from .cart_utils import lock_cart
+from .inventory import reserve_cart
+from .pricing import CENT, ZERO, cart_items, is_sellable, price_cart, refresh_cart_totals
+
+
+class EmptyCart(Exception):
+    pass
+
+
+def _line_title(product, unit):
+    return f"{product.title} – {unit.label}" if unit else product.title
+
+
+class Unavailable(Exception):
+    def __init__(self, items):
+        self.items = items  # CartItems no longer for sale
+        titles = ", ".join(_line_title(ci.product, ci.product_unit) for ci in items)
+        super().__init__(f"No longer available: {titles}")
+
+
+def _order_totals():
+    """Correlated subqueries for an Order's subtotal / tax_total / total."""
+    line_total = ExpressionWrapper(
+        F("unit_price") * F("qty"), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    # "* 0.01" rather than "/ 100": SQLite would divide integers
+    line_tax = Round(line_total * F("tax_percent") * Value(CENT), 2)
+    sums = {
+        "subtotal": Sum(line_total),
+        "tax_total": Sum(line_tax),
+        "total": Sum(line_total + line_tax),
+    }
+    return {
+        name: Coalesce(
+            Subquery(
+                OrderItem.objects.filter(order=OuterRef("pk"))
+                .order_by()
+                .values("order")
+                .annotate(v=expression)
+                .values("v")
+            ),
+            Value(ZERO),
+            output_field=Order._meta.get_field(name),
+        )
+        for name, expression in sums.items()
+    }
+
+
+def _order_item(order, line):
+    product, unit = line["product"], line["product_unit"]
+    return OrderItem(
+        order=order,
+        product=product,
+        title=_line_title(product, unit),
+        qty=line["qty"],
+        unit_price=line["unit_price"],
+        tax_percent=line["tax_percent"],
+        metadata={"product_unit_id": unit.pk, "unit_label": unit.label} if unit else None,
+    )
+
+
+def _hold_stock(cart, lines):
+    """
+    Make sure the cart holds exactly the tracked units it is buying. The
+    holds are locked first so release_expired() can't give the same stock
+    back meanwhile; expired (or mismatched) holds are taken afresh.
+    """
+    wanted = defaultdict(int)
+    for line in lines:
+        unit = line["product_unit"]
+        if unit is not None and unit.stock is not None:
+            wanted[unit.pk] += line["qty"]
+
+    now = timezone.now()
+    held, expired = {}, False
+    for unit_id, qty, expires_at in (
+        StockReservation.objects.select_for_update()
+        .filter(cart=cart)
+        .values_list("product_unit_id", "qty", "expires_at")
+    ):
+        if expires_at > now:
+            held[unit_id] = qty
+        else:
+            expired = True
+    if expired or held != wanted:
+        reserve_cart(cart)  # raises OutOfStock, rolling the order back
+
+
+def drop_unavailable(cart):
+    """Remove the cart's lines that are no longer for sale; returns them."""
+    with transaction.atomic():
+        lock_cart(cart)
+        gone = [ci for ci in cart_items(cart) if not is_sellable(ci)]
+        if gone:
+            CartItem.objects.filter(pk__in=[ci.pk for ci in gone]).delete()
+            refresh_cart_totals(cart)
+    return gone
+
+
+def place_order(cart, user=None):
+    """
+    Convert a DB cart into a pending Order and empty the cart.
+    Raises EmptyCart if there is nothing to buy, Unavailable if a line is no
+    longer for sale and OutOfStock if a tracked unit can't be covered; in
+    every case nothing is written.
+    """
+    with transaction.atomic():
+        lock_cart(cart)
+        items = cart_items(cart)
+        unavailable = [ci for ci in items if not is_sellable(ci)]
+        if unavailable:
+            raise Unavailable(unavailable)
+
+        priced = price_cart(cart, items)
+        if not priced["lines"]:
+            raise EmptyCart("Your cart is empty.")
+
+        _hold_stock(cart, priced["lines"])
+
+        order = Order.objects.create(user=user or cart.user)
+        OrderItem.objects.bulk_create(_order_item(order, line) for line in priced["lines"])
+        Order.objects.filter(pk=order.pk).update(**_order_totals())
+        order.refresh_from_db(fields=["subtotal", "tax_total", "total"])
+
+        # the held stock is now sold: drop the holds without returning it
+        StockReservation.objects.filter(cart=cart).delete()
+        CartItem.objects.filter(cart=cart).delete()
+        refresh_cart_totals(cart)
+
+    return order
@@ -0,0 +1,223 @@
+# shop/pricing.py
+"""
+PriceBook: the one place unit prices, per-line tax and cart totals are
+worked out.
+
+A batch of PriceLine(product_id, product_unit_id, qty[, unit_price]) is
+priced in one pass over products and units loaded up front (two queries
+via PriceBook.load, none if the caller already has them), so carts of any
+size cost the same number of queries. All money is Decimal, quantized to
+paise with ROUND_HALF_UP; tax is rounded per line and totals are sums of
+rounded lines, so every page shows the same figures.
+
+cart_summary() gives the same totals for a DB cart straight from SQL
+(one aggregate query) when the individual lines aren't needed.
+"""
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .models import ShopItem, ProductUnit, Cart, CartItem
+from .cart_count import forget_cart_counts
+
+ZERO = Decimal("0.00")
+CENT = Decimal("0.01")
+HUNDRED = Decimal("100")
+
+# unit_price: price already agreed for the line (e.g. CartItem snapshot);
+# None to resolve it from the unit / product.
+PriceLine = namedtuple("PriceLine", "product_id product_unit_id qty unit_price", defaults=(None,))
+
+
+def money(amount):
+    return Decimal(amount or 0).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def unit_price_for(product, unit=None):
+    """Current sell price of a product, or of one of its units."""
+    if unit is not None:
+        return money(unit.price)
+    return money(product.price)
+
+
+class PriceBook:
+    def __init__(self, products, units=None):
+        self.products = products
+        self.units = units or {}
+
+    @classmethod
+    def load(cls, lines, published_only=True):
+        """Fetch the products and active units the lines refer to."""
+        product_ids = {line.product_id for line in lines}
+        unit_ids = {line.product_unit_id for line in lines if line.product_unit_id}
+
+        products = ShopItem.objects.filter(pk__in=product_ids).select_related("category")
+        if published_only:
+            products = products.filter(published=True)
+        units = (
+            ProductUnit.objects.filter(pk__in=unit_ids, is_active=True).in_bulk()
+            if unit_ids
+            else {}
+        )
+        return cls(products.in_bulk(), units)
+
+    def price(self, lines):
+        """
+        Price the lines. Returns a dict with `lines` (one dict per priceable
+        line: product, product_unit, qty, unit_price, line_total,
+        tax_percent, tax), `item_count`, `subtotal`, `tax_total` and `total`.
+        Lines whose product or unit is gone are dropped.
+        """
+        rows = []
+        subtotal = tax_total = ZERO
+        item_count = 0
+
+        for line in lines:
+            product = self.products.get(int(line.product_id))
+            if product is None:
+                continue
+            unit = None
+            if line.product_unit_id:
+                unit = self.units.get(int(line.product_unit_id))
+                if unit is None or unit.product_id != product.pk:
+                    continue
+
+            qty = int(line.qty)
+            unit_price = (
+                money(line.unit_price)
+                if line.unit_price is not None
+                else unit_price_for(product, unit)
+            )
+            line_total = unit_price * qty
+            tax_percent = product.tax_percent or ZERO
+            tax = money(line_total * tax_percent / HUNDRED)
+
+            rows.append({
+                "product": product,
+                "product_unit": unit,
+                "qty": qty,
+                "unit_price": unit_price,
+                "line_total": line_total,
+                "tax_percent": tax_percent,
+                "tax": tax,
+            })
+            item_count += qty
+            subtotal += line_total
+            tax_total += tax
+
+        return {
+            "lines": rows,
+            "item_count": item_count,
+            "subtotal": subtotal,
+            "tax_total": tax_total,
+            "total": subtotal + tax_total,
+        }
+
+
+def cart_items(cart):
+    """A DB cart's items with product, category and unit joined in (one query)."""
+    return list(cart.items.select_related("product__category", "product_unit"))
+
+
+def is_sellable(item):
+    """The PriceBook.load() rule for a CartItem: published product, active unit."""
+    unit = item.product_unit
+    return item.product.published and (unit is None or unit.is_active)
+
+
+def price_cart(cart, items=None):
+    """
+    Price a DB Cart at the unit prices stored on its items (one query, none
+    if its cart_items() are passed in). Lines no longer for sale are
+    dropped, as PriceBook.load() drops them from guest carts.
+    """
+    if items is None:
+        items = cart_items(cart)
+    items = [ci for ci in items if is_sellable(ci)]
+    book = PriceBook(
+        {ci.product_id: ci.product for ci in items},
+        {ci.product_unit_id: ci.product_unit for ci in items if ci.product_unit_id},
+    )
+    return book.price(
+        PriceLine(ci.product_id, ci.product_unit_id, ci.qty, ci.unit_price) for ci in items
+    )
+
+
+def _line_sums():
+    """Aggregates over CartItems matching the PriceBook's per-line rounding."""
+    line_total = ExpressionWrapper(
+        F("unit_price") * F("qty"), output_field=DecimalField(max_digits=12, decimal_places=2)
+    )
+    return {
+        "item_count": Sum("qty"),
+        "subtotal": Sum(line_total),
+        # "* 0.01" rather than "/ 100": SQLite would divide integers
+        "tax_total": Sum(Round(line_total * F("product__tax_percent") * Value(CENT), 2)),
+    }
+
+
+def summarize_items(items):
+    """
+    item_count / subtotal / tax_total / total of a CartItem queryset in one
+    aggregate query, rounding tax per line exactly like PriceBook.price().
+    """
+    totals = items.aggregate(**_line_sums())
+    subtotal = money(totals["subtotal"])
+    tax_total = money(totals["tax_total"])
+    return {
+        "item_count": totals["item_count"] or 0,
+        "subtotal": subtotal,
+        "tax_total": tax_total,
+        "total": subtotal + tax_total,
+    }
+
+
+def cart_summary(cart_id):
+    return summarize_items(CartItem.objects.filter(cart_id=cart_id))
+
+
+def refresh_cart_totals(cart):
+    """
+    Rewrite a cart's stored totals from its items and return the summary.
+    Call it inside the transaction that changed the items.
+    """
+    summary = cart_summary(cart.pk)
+    values = {
+        "item_count": summary["item_count"],
+        "subtotal": summary["subtotal"],
+        "tax_total": summary["tax_total"],
+        "updated_at": timezone.now(),
+    }
+    Cart.objects.filter(pk=cart.pk).update(**values)
+    for name, value in values.items():
+        setattr(cart, name, value)
+    forget_cart_counts([cart.user_id])
+    return summary
+
+
+def stored_totals_subqueries():
+    """Correlated per-cart subqueries for item_count / subtotal / tax_total."""
+    zero = {"item_count": Value(0), "subtotal": Value(ZERO), "tax_total": Value(ZERO)}
+    return {
+        name: Coalesce(
+            Subquery(
+                CartItem.objects.filter(cart=OuterRef("pk"))
+                .order_by()
+                .values("cart")
+                .annotate(v=expression)
+                .values("v")
+            ),
+            zero[name],
+            output_field=Cart._meta.get_field(name),
+        )
+        for name, expression in _line_sums().items()
+    }
+
+
+def recompute_cart_totals(carts):
+    """Set-based refresh of the stored totals for a Cart queryset (one UPDATE)."""
+    forget_cart_counts(carts.filter(user__isnull=False).values_list("user_id", flat=True))
+    return carts.update(**stored_totals_subqueries())
@@ -0,0 +1,203 @@
+# shop/recommendations.py
+"""
+"Frequently bought together", precomputed by the build_recommendations
+command so product pages only read ShopItemRecommendation.
+
+Orders are folded into ShopItemCooccurrence incrementally (everything past
+RecommendationCheckpoint.last_order_id). Open carts are a weaker signal on
+top of the stored order counts and are not stored: a run re-scores only
+the items in carts changed since RecommendationCheckpoint.last_cart_at,
+counting their cart pairs afresh from the carts that hold them. Items
+whose carts have since emptied keep that cart boost until the next --full
+run (run one nightly). Counting is sparse: only pairs that actually occur
+together in a basket are materialised. Items are re-scored CHUNK_SIZE at
+a time, so no query carries more ids than that.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations, groupby
+
+from django.db import transaction
+from django.db.models import Q, Subquery
+from django.utils import timezone
+
+from .models import (
+    CartItem,
+    Order,
+    OrderItem,
+    RecommendationCheckpoint,
+    ShopItem,
+    ShopItemCooccurrence,
+    ShopItemListing,
+    ShopItemRecommendation,
+)
+
+TOP_N = 8
+CART_WEIGHT = 0.25
+# baskets bigger than this are bulk buys and say little about affinity
+MAX_BASKET = 50
+CHUNK_SIZE = 2000
+# carts are stamped before their transaction commits, so each run looks
+# this far behind the checkpoint for carts that committed late
+CART_OVERLAP = timedelta(minutes=5)
+
+
+def recommended_listings(item_id, limit=TOP_N):
+    """Listing rows recommended for an item, best first, in one query."""
+    return ShopItemListing.objects.filter(
+        item__recommended_in__item_id=item_id
+    ).order_by("item__recommended_in__rank")[:limit]
+
+
+def _baskets(rows):
+    """Group (basket_id, product_id) rows, ordered by basket, into sets of products."""
+    for _key, group in groupby(rows, key=lambda row: row[0]):
+        products = {product_id for _key, product_id in group}
+        if 1 < len(products) <= MAX_BASKET:
+            yield products
+
+
+def count_pairs(baskets, weight=1):
+    pairs = Counter()
+    for products in baskets:
+        for a, b in combinations(sorted(products), 2):
+            pairs[(a, b)] += weight
+    return pairs
+
+
+def _order_pairs(after_order_id, upto_order_id):
+    rows = (
+        OrderItem.objects.filter(
+            order_id__gt=after_order_id, order_id__lte=upto_order_id, product__isnull=False
+        )
+        .exclude(order__status=Order.STATUS_CANCELLED)
+        .order_by("order_id")
+        .values_list("order_id", "product_id")
+    )
+    return count_pairs(_baskets(rows.iterator(chunk_size=CHUNK_SIZE)))
+
+
+def _cart_pairs(item_ids=None):
+    """Cart pair counts; with item_ids, from the carts holding any of them only."""
+    rows = CartItem.objects.all()
+    if item_ids is not None:
+        rows = rows.filter(
+            cart_id__in=Subquery(CartItem.objects.filter(product_id__in=item_ids).values("cart_id"))
+        )
+    rows = rows.order_by("cart_id").values_list("cart_id", "product_id")
+    return count_pairs(_baskets(rows.iterator(chunk_size=CHUNK_SIZE)), weight=CART_WEIGHT)
+
+
+def _changed_cart_items(since):
+    """Items in carts changed after `since` (every item in a cart if None)."""
+    rows = CartItem.objects.all()
+    if since is not None:
+        rows = rows.filter(cart__updated_at__gt=since - CART_OVERLAP)
+    return set(rows.values_list("product_id", flat=True).distinct())
+
+
+def _add_cooccurrence(pairs):
+    """Add new order pair counts to the stored matrix."""
+    pairs = list(pairs.items())
+    for start in range(0, len(pairs), CHUNK_SIZE):
+        chunk = dict(pairs[start:start + CHUNK_SIZE])
+        items = {a for a, _b in chunk}
+        existing = {
+            (row.item_id, row.related_id): row
+            for row in ShopItemCooccurrence.objects.filter(
+                item_id__in=items, related_id__in={b for _a, b in chunk}
+            )
+            if (row.item_id, row.related_id) in chunk
+        }
+        for key, row in existing.items():
+            row.orders += chunk[key]
+        ShopItemCooccurrence.objects.bulk_update(existing.values(), ["orders"])
+        ShopItemCooccurrence.objects.bulk_create(
+            ShopItemCooccurrence(item_id=a, related_id=b, orders=n)
+            for (a, b), n in chunk.items()
+            if (a, b) not in existing
+        )
+
+
+def _scores(item_ids, cart_pairs):
+    """{item: Counter(related: score)} for the given items."""
+    scores = defaultdict(Counter)
+    stored = ShopItemCooccurrence.objects.filter(
+        Q(item_id__in=item_ids) | Q(related_id__in=item_ids)
+    ).values_list("item_id", "related_id", "orders")
+    for a, b, n in stored.iterator(chunk_size=CHUNK_SIZE):
+        scores[a][b] += n
+        scores[b][a] += n
+    wanted = set(item_ids)
+    for (a, b), n in cart_pairs.items():
+        if a not in wanted and b not in wanted:
+            continue
+        scores[a][b] += n
+        scores[b][a] += n
+    return {item_id: scores[item_id] for item_id in item_ids}
+
+
+def _refresh(item_ids, cart_pairs, top_n):
+    """Rewrite the top-N rows of these items where they changed; returns those items."""
+    current = defaultdict(list)
+    for item_id, related_id in ShopItemRecommendation.objects.filter(
+        item_id__in=item_ids
+    ).values_list("item_id", "related_id"):
+        current[item_id].append(related_id)
+
+    changed, rows = [], []
+    for item_id, related in _scores(item_ids, cart_pairs).items():
+        top = sorted(related.items(), key=lambda kv: (-kv[1], kv[0]))[:top_n]
+        if [related_id for related_id, _score in top] != current.get(item_id, []):
+            changed.append(item_id)
+            rows += [
+                ShopItemRecommendation(item_id=item_id, related_id=related_id, rank=rank, score=score)
+                for rank, (related_id, score) in enumerate(top, start=1)
+            ]
+
+    ShopItemRecommendation.objects.filter(item_id__in=changed).delete()
+    ShopItemRecommendation.objects.bulk_create(rows, batch_size=CHUNK_SIZE)
+
+    if changed:
+        # the recommendations live inside the cached, ETagged detail page
+        ShopItem.objects.filter(pk__in=changed).update(updated_at=timezone.now())
+    return changed
+
+
+def build_recommendations(full=False, top_n=TOP_N):
+    """
+    Fold new orders into the co-occurrence matrix and refresh the top-N rows
+    of every item they (or changed carts) touch. Returns the number of items
+    whose recommendations changed.
+    """
+    with transaction.atomic():
+        checkpoint, _ = RecommendationCheckpoint.objects.select_for_update().get_or_create(pk=1)
+        if full:
+            ShopItemCooccurrence.objects.all().delete()
+            checkpoint.last_order_id = 0
+            checkpoint.last_cart_at = None
+
+        started = timezone.now()
+        last_order_id = Order.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+        order_pairs = _order_pairs(checkpoint.last_order_id, last_order_id)
+        _add_cooccurrence(order_pairs)
+
+        if full:
+            affected = set(ShopItem.objects.values_list("pk", flat=True))
+            cart_pairs = _cart_pairs()  # one pass over every cart
+        else:
+            affected = {item_id for pair in order_pairs for item_id in pair}
+            affected |= _changed_cart_items(checkpoint.last_cart_at)
+
+        changed = 0
+        affected = sorted(affected)
+        for start in range(0, len(affected), CHUNK_SIZE):
+            chunk = affected[start:start + CHUNK_SIZE]
+            chunk_pairs = cart_pairs if full else _cart_pairs(chunk)
+            changed += len(_refresh(chunk, chunk_pairs, top_n))
+
+        checkpoint.last_order_id = last_order_id
+        checkpoint.last_cart_at = started
+        checkpoint.save()
+
+    return changed
@@ -0,0 +1,57 @@
+# shop/repricing.py
+"""
+Keep open carts at current prices.
+
+CartItem.unit_price is a snapshot taken when the line was added. When a
+ProductUnit or ShopItem price changes (admin save, admin reprice action,
+catalogue import) the affected lines are rewritten with set-based UPDATEs
+- one for unit lines, one for unit-less lines, however many carts hold
+them - and the stored totals of those carts are recomputed with one more
+UPDATE (pricing.recompute_cart_totals). Nothing loops over carts in
+Python. A ShopItem tax_percent change only needs the totals step.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+
+from .models import Cart, CartItem, ProductUnit, ShopItem
+from .pricing import recompute_cart_totals
+
+
+def reprice_carts(product_ids=(), unit_ids=(), tax_product_ids=()):
+    """Rewrite cart lines for changed SKUs and refresh their carts' totals. Returns lines updated."""
+    product_ids, unit_ids, tax_product_ids = set(product_ids), set(unit_ids), set(tax_product_ids)
+    lines = 0
+    with transaction.atomic():
+        if unit_ids:
+            lines += CartItem.objects.filter(product_unit_id__in=unit_ids).update(
+                unit_price=Subquery(
+                    ProductUnit.objects.filter(pk=OuterRef("product_unit_id")).values("price")[:1]
+                )
+            )
+        if product_ids:
+            lines += CartItem.objects.filter(
+                product_id__in=product_ids,
+                product_unit__isnull=True,
+                product__price__isnull=False,
+            ).update(
+                unit_price=Subquery(
+                    ShopItem.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+                )
+            )
+
+        affected = (
+            Q(product_unit_id__in=unit_ids)
+            | Q(product_id__in=product_ids, product_unit__isnull=True)
+            | Q(product_id__in=tax_product_ids)
+        )
+        recompute_cart_totals(
+            Cart.objects.filter(pk__in=CartItem.objects.filter(affected).values("cart_id"))
+        )
+    return lines
+
+
+def prices_changed(product_ids=(), unit_ids=(), tax_product_ids=()):
+    """Reprice open carts once the current transaction commits."""
+    product_ids, unit_ids, tax_product_ids = list(product_ids), list(unit_ids), list(tax_product_ids)
+    if product_ids or unit_ids or tax_product_ids:
+        transaction.on_commit(lambda: reprice_carts(product_ids, unit_ids, tax_product_ids))
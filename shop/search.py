@@ -0,0 +1,146 @@
+# shop/search.py
+"""
+Full-text search over ShopItem title/description.
+
+SQLite: an FTS5 table `shop_shopitem_fts` keyed by the item id, refreshed
+from shop.signals whenever items change.
+PostgreSQL: a generated `search_vector` tsvector column on shop_shopitem
+with a GIN index, so the database keeps it in sync itself.
+Any other backend falls back to icontains.
+
+Both index tables are created by migration 0004_shopitem_search.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import ShopItem
+
+FTS_TABLE = "shop_shopitem_fts"
+SEARCH_LIMIT = 48
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _tokens(query):
+    return _TOKEN_RE.findall(query or "")[:8]
+
+
+def _sqlite_match(tokens):
+    # Every token must match, as a prefix.
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def _postgres_tsquery(tokens):
+    return " & ".join(f"{token}:*" for token in tokens)
+
+
+def _sqlite_ids(tokens, limit, published_only):
+    # Title hits weigh 10x description.
+    match = _sqlite_match(tokens)
+    sql = (
+        f"SELECT f.rowid FROM {FTS_TABLE} f "
+        f"JOIN shop_shopitem i ON i.id = f.rowid "
+        f"WHERE {FTS_TABLE} MATCH %s"
+    )
+    if published_only:
+        sql += " AND i.published"
+    sql += f" ORDER BY bm25({FTS_TABLE}, 10.0, 1.0)"
+    params = [match]
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_ids(tokens, limit, published_only):
+    tsquery = _postgres_tsquery(tokens)
+    sql = (
+        "SELECT id FROM shop_shopitem "
+        "WHERE search_vector @@ to_tsquery('english', %s)"
+    )
+    if published_only:
+        sql += " AND published"
+    sql += " ORDER BY ts_rank(search_vector, to_tsquery('english', %s)) DESC, id DESC"
+    params = [tsquery, tsquery]
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_item_ids(query, limit=SEARCH_LIMIT, published_only=True):
+    """Return ShopItem ids matching `query`, best match first."""
+    tokens = _tokens(query)
+    if not tokens:
+        return []
+
+    if connection.vendor == "sqlite":
+        return _sqlite_ids(tokens, limit, published_only)
+    if connection.vendor == "postgresql":
+        return _postgres_ids(tokens, limit, published_only)
+
+    items = ShopItem.objects.all()
+    if published_only:
+        items = items.filter(published=True)
+    for token in tokens:
+        items = items.filter(Q(title__icontains=token) | Q(description__icontains=token))
+    ids = items.values_list("id", flat=True)
+    return list(ids[:limit] if limit else ids)
+
+
+def filter_matching(queryset, query):
+    """
+    Narrow a ShopItem queryset to the items matching `query`, with no limit
+    and no ranking, so the caller can order and paginate it in SQL (admin).
+    """
+    tokens = _tokens(query)
+    if not tokens:
+        return queryset.none()
+
+    if connection.vendor == "sqlite":
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [_sqlite_match(tokens)]
+        ))
+    if connection.vendor == "postgresql":
+        return queryset.filter(pk__in=RawSQL(
+            "SELECT id FROM shop_shopitem WHERE search_vector @@ to_tsquery('english', %s)",
+            [_postgres_tsquery(tokens)],
+        ))
+
+    for token in tokens:
+        queryset = queryset.filter(Q(title__icontains=token) | Q(description__icontains=token))
+    return queryset
+
+
+def index_items(item_ids):
+    """Re-index the given items (SQLite only; Postgres maintains its own column)."""
+    item_ids = [int(pk) for pk in item_ids]
+    if connection.vendor != "sqlite" or not item_ids:
+        return
+
+    placeholders = ", ".join(["%s"] * len(item_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", item_ids)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, description FROM shop_shopitem WHERE id IN ({placeholders})",
+            item_ids,
+        )
+
+
+def rebuild_search_index():
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, description FROM shop_shopitem"
+        )
@@ -0,0 +1,67 @@
+# shop/serializers.py
+from rest_framework import serializers
+
+from .models import ShopItem, ProductUnit, ProductImage
+
+
+class SparseFieldsMixin:
+    """
+    `?fields=id,title,units` trims the representation to those fields.
+    Unknown names are ignored; no `fields` means everything.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context.get("request"))
+        if wanted:
+            for name in set(self.fields) - wanted:
+                self.fields.pop(name)
+
+
+def requested_fields(request):
+    raw = request.query_params.get("fields") if request is not None else None
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(",") if name.strip()}
+
+
+class ProductUnitSerializer(serializers.ModelSerializer):
+    unit_type = serializers.SlugRelatedField(slug_field="code", read_only=True)
+
+    class Meta:
+        model = ProductUnit
+        fields = ("id", "unit_type", "label", "value", "price", "is_default")
+
+
+class ProductImageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductImage
+        fields = ("id", "image", "order")
+
+
+class ShopItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    category = serializers.SlugRelatedField(slug_field="slug", read_only=True)
+    category_name = serializers.CharField(source="category.name", read_only=True)
+    effective_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    units = ProductUnitSerializer(many=True, read_only=True, source="active_units")
+    gallery = ProductImageSerializer(many=True, read_only=True, source="gallery_images.all")
+
+    class Meta:
+        model = ShopItem
+        fields = (
+            "id",
+            "title",
+            "slug",
+            "category",
+            "category_name",
+            "description",
+            "price",
+            "effective_price",
+            "tax_percent",
+            "is_experience",
+            "image",
+            "units",
+            "gallery",
+            "created_at",
+            "updated_at",
+        )
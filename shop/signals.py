@@ -1,8 +1,118 @@
 # shop/signals.py
 from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+
 from .cart_utils import merge_session_cart_to_user
+from .images import schedule_derivatives
+from .listing import refresh_listings, refresh_category_listings
+from .search import index_items
+from .repricing import prices_changed
+from .models import ShopItem, ShopCategory, ProductUnit, ProductImage
+
 
 @receiver(user_logged_in)
 def on_user_login(sender, user, request, **kwargs):
     merge_session_cart_to_user(request, user)
+
+
+# ---------------------------
+# Listing snapshot
+# ---------------------------
+# Refreshes run after commit: admin saves an item and its inlines in one
+# transaction, and cascading deletes fire child signals before the parent
+# row is gone.
+
+def _sync_catalog(item_ids):
+    # rewriting the listing rows also moves the cards' fragment versions
+    refresh_listings(item_ids)
+    index_items(item_ids)
+
+
+def catalog_changed(item_ids, touch=True):
+    """
+    Schedule everything derived from these ShopItems to be rebuilt. With
+    `touch`, their updated_at (the product pages' Last-Modified / ETag) is
+    bumped right away, in the caller's transaction: bulk writes to items,
+    units and images don't set it themselves.
+    """
+    item_ids = list(item_ids)
+    if touch and item_ids:
+        ShopItem.objects.filter(pk__in=item_ids).update(updated_at=timezone.now())
+    transaction.on_commit(lambda: _sync_catalog(item_ids))
+
+
+@receiver(post_save, sender=ShopItem)
+@receiver(post_delete, sender=ShopItem)
+def on_shop_item_change(sender, instance, **kwargs):
+    # save() has just set updated_at
+    catalog_changed([instance.pk], touch=False)
+
+
+@receiver(post_save, sender=ProductUnit)
+@receiver(post_delete, sender=ProductUnit)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+def on_product_child_change(sender, instance, **kwargs):
+    # the product page shows units and gallery, so they move its Last-Modified
+    catalog_changed([instance.product_id])
+
+
+@receiver(post_save, sender=ShopItem)
+@receiver(post_save, sender=ProductImage)
+def on_image_saved(sender, instance, **kwargs):
+    if instance.image:
+        item_id = instance.pk if sender is ShopItem else instance.product_id
+        schedule_derivatives(instance.image.name, item_id)
+
+
+@receiver(post_save, sender=ShopCategory)
+def on_category_change(sender, instance, created, **kwargs):
+    if not created:
+        refresh_category_listings(instance)
+        instance.shopitem.update(updated_at=timezone.now())
+
+
+# ---------------------------
+# Cart repricing
+# ---------------------------
+# Before a save that writes a price field, compare it with the stored row
+# (one small lookup) so the save can tell whether open carts need
+# repricing. Bulk paths (reprice action, import) call prices_changed()
+# themselves.
+
+PRICE_FIELDS = {ShopItem: ("price", "tax_percent"), ProductUnit: ("price",)}
+
+
+@receiver(pre_save, sender=ShopItem)
+@receiver(pre_save, sender=ProductUnit)
+def note_price_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._changed_prices = ()
+    fields = [
+        name for name in PRICE_FIELDS[sender]
+        if update_fields is None or name in update_fields
+    ]
+    if raw or instance._state.adding or not fields:
+        return
+    stored = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+    if stored is not None:
+        instance._changed_prices = {
+            name for name, value in zip(fields, stored) if value != getattr(instance, name)
+        }
+
+
+@receiver(post_save, sender=ShopItem)
+def on_item_price_change(sender, instance, created, **kwargs):
+    changed = instance.__dict__.pop("_changed_prices", ())
+    prices_changed(
+        product_ids=[instance.pk] if "price" in changed else (),
+        tax_product_ids=[instance.pk] if "tax_percent" in changed else (),
+    )
+
+
+@receiver(post_save, sender=ProductUnit)
+def on_unit_price_change(sender, instance, created, **kwargs):
+    if "price" in instance.__dict__.pop("_changed_prices", ()):
+        prices_changed(unit_ids=[instance.pk])
@@ -0,0 +1,51 @@
+from django import template
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from shop.images import available_derivatives, derivative_name
+
+register = template.Library()
+
+
+def _storage_name(image):
+    """Accept an ImageField file or a media URL (as stored on ShopItemListing)."""
+    if hasattr(image, "name"):
+        return image.name, image.url
+    if image and image.startswith(settings.MEDIA_URL):
+        return image[len(settings.MEDIA_URL):], image
+    return None, image
+
+
+@register.simple_tag
+def responsive_img(image, sizes="100vw", **attrs):
+    """
+    <picture> with WebP/AVIF srcsets for an uploaded image, falling back to
+    the original. Extra keyword arguments become <img> attributes, e.g.
+    {% responsive_img item.image sizes="70px" alt=item.title loading="lazy" %}
+    """
+    if not image:
+        return ""
+    name, url = _storage_name(image)
+
+    sources = []
+    if name:
+        for fmt, widths in available_derivatives(name).items():
+            if widths:
+                srcset = ", ".join(
+                    f"{default_storage.url(derivative_name(name, w, fmt))} {w}w" for w in widths
+                )
+                sources.append((f"image/{fmt}", srcset, sizes))
+
+    img = format_html(
+        "<img src=\"{}\"{}>",
+        url,
+        format_html_join("", " {}=\"{}\"", attrs.items()),
+    )
+    if not sources:
+        return img
+    return format_html(
+        "<picture>{}{}</picture>",
+        format_html_join("", "<source type=\"{}\" srcset=\"{}\" sizes=\"{}\">", sources),
+        img,
+    )
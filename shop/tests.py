@@ -1,3 +1,337 @@
-from django.test import TestCase
+import random
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import IntegrityError, OperationalError, connection
+from django.http import JsonResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .cart_utils import add_to_db_cart
+from .context_processors import cart_count
+from .idempotency import LEASE_SECONDS, idempotent
+from .inventory import OutOfStock, adjust_stock, release_expired, reserve_cart, take_stock
+from .models import (
+    Cart, IdempotencyKey, Order, ShopCategory, ShopItem, ProductUnit, StockReservation, UnitType,
+)
+from .orders import Unavailable, place_order
+
+
+def run_concurrently(work, threads, timeout=60):
+    """
+    Call `work()` repeatedly in `threads` threads released together, until
+    it returns False; each thread gets its own DB connection. SQLite reports
+    contention as "database is locked" rather than waiting on a row lock, so
+    those calls are retried after a random pause. Returns the number of
+    retries.
+    """
+    start = threading.Barrier(threads)
+    deadline = time.monotonic() + timeout
+    retries, errors = [], []
+
+    def worker():
+        start.wait()
+        try:
+            while True:
+                if time.monotonic() > deadline:
+                    raise AssertionError(f"Threads still busy after {timeout}s")
+                try:
+                    if not work():
+                        return
+                except OperationalError:
+                    retries.append(1)
+                    time.sleep(random.uniform(0, 0.005))
+        except Exception as exc:  # re-raised in the test thread
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if errors:
+        raise errors[0]
+    return len(retries)
+
+
+def repeat_per_thread(times, call):
+    """A run_concurrently() work function that makes `times` calls in each thread."""
+    done = threading.local()
+
+    def work():
+        done.count = getattr(done, "count", 0)
+        if done.count == times:
+            return False
+        call()
+        done.count += 1
+        return True
+
+    return work
+
+
+class CatalogMixin:
+    def make_unit(self, price="50.00", stock=None):
+        category = ShopCategory.objects.create(name="Mixers")
+        item = ShopItem.objects.create(
+            title="Tonic", category=category, price=Decimal("40.00"), tax_percent=Decimal("18.00")
+        )
+        unit_type = UnitType.objects.create(name="Volume", code="volume")
+        return ProductUnit.objects.create(
+            product=item, unit_type=unit_type, label="500 ml", price=Decimal(price), stock=stock
+        )
+
+
+class ConcurrentAddToCartTests(CatalogMixin, TransactionTestCase):
+    THREADS = 8
+    ADDS = 10
+
+    def setUp(self):
+        self.unit = self.make_unit()
+        self.user = get_user_model().objects.create(username="shopper")
+        self.cart = Cart.objects.create(user=self.user)
+
+    def _hammer(self, unit):
+        product = self.unit.product
+        run_concurrently(
+            repeat_per_thread(self.ADDS, lambda: add_to_db_cart(self.cart, product, unit, 1)),
+            self.THREADS,
+        )
+
+    def _assert_one_line(self, unit_price):
+        expected = self.THREADS * self.ADDS
+        self.assertEqual(list(self.cart.items.values_list("qty", flat=True)), [expected])
+
+        self.cart.refresh_from_db()
+        subtotal = unit_price * expected
+        self.assertEqual(self.cart.item_count, expected)
+        self.assertEqual(self.cart.subtotal, subtotal)
+        self.assertEqual(self.cart.tax_total, (subtotal * Decimal("0.18")).quantize(Decimal("0.01")))
+
+    def test_concurrent_unit_adds_lose_no_updates(self):
+        self._hammer(self.unit)
+        self._assert_one_line(self.unit.price)
+
+    def test_concurrent_plain_adds_lose_no_updates(self):
+        self._hammer(None)
+        self._assert_one_line(self.unit.product.price)
+
+
+class ConcurrentStockTests(CatalogMixin, TransactionTestCase):
+    THREADS = 8
+    ATTEMPTS = 10
+    STOCK = 30
+
+    def test_concurrent_takes_never_oversell(self):
+        unit = self.make_unit(stock=self.STOCK)
+        sold, refused = [], []
+
+        def take():
+            (sold if take_stock(unit.pk, 1) else refused).append(1)
+
+        run_concurrently(repeat_per_thread(self.ATTEMPTS, take), self.THREADS)
+
+        unit.refresh_from_db()
+        self.assertEqual(len(sold), self.STOCK)
+        self.assertEqual(len(refused), self.THREADS * self.ATTEMPTS - self.STOCK)
+        self.assertEqual(unit.stock, 0)
+
+    def test_adjust_stock_applies_on_top_of_sales(self):
+        unit = self.make_unit(stock=10)
+        take_stock(unit.pk, 3)
+        adjust_stock(unit.pk, 5)
+        unit.refresh_from_db()
+        self.assertEqual(unit.stock, 12)
+
+        adjust_stock(unit.pk, -20)
+        unit.refresh_from_db()
+        self.assertEqual(unit.stock, 0)
+
+    def test_adjust_stock_starts_tracking(self):
+        unit = self.make_unit()
+        adjust_stock(unit.pk, 4)
+        unit.refresh_from_db()
+        self.assertEqual(unit.stock, 4)
+
+
+class PlaceOrderTests(CatalogMixin, TransactionTestCase):
+    def setUp(self):
+        self.unit = self.make_unit(stock=10)
+        self.user = get_user_model().objects.create(username="shopper")
+        self.cart = Cart.objects.create(user=self.user)
+        add_to_db_cart(self.cart, self.unit.product, self.unit, 3)
+
+    def stock(self):
+        self.unit.refresh_from_db()
+        return self.unit.stock
+
+    def assert_nothing_ordered(self, stock):
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(list(self.cart.items.values_list("qty", flat=True)), [3])
+        self.assertEqual(self.stock(), stock)
+
+    def test_order_clears_cart_and_takes_stock_once(self):
+        reserve_cart(self.cart)
+        self.assertEqual(self.stock(), 7)
+
+        order = place_order(self.cart)
+
+        self.assertEqual(order.total, Decimal("177.00"))
+        self.assertEqual(list(order.items.values_list("qty", flat=True)), [3])
+        self.assertFalse(self.cart.items.exists())
+        self.assertFalse(StockReservation.objects.exists())
+        self.cart.refresh_from_db()
+        self.assertEqual(self.cart.item_count, 0)
+        # the hold became the sale: nothing taken again, nothing handed back
+        release_expired(now=timezone.now() + timedelta(days=1))
+        self.assertEqual(self.stock(), 7)
+
+    def test_order_without_checkout_hold_takes_stock(self):
+        place_order(self.cart)
+        self.assertEqual(self.stock(), 7)
+
+    def test_unpublished_product_is_refused(self):
+        reserve_cart(self.cart)
+        ShopItem.objects.filter(pk=self.unit.product_id).update(published=False)
+        with self.assertRaises(Unavailable):
+            place_order(self.cart)
+        self.assert_nothing_ordered(stock=7)
+
+    def test_inactive_unit_is_refused(self):
+        ProductUnit.objects.filter(pk=self.unit.pk).update(is_active=False)
+        with self.assertRaises(Unavailable):
+            place_order(self.cart)
+        self.assert_nothing_ordered(stock=10)
+
+    def test_expired_hold_is_not_trusted(self):
+        reserve_cart(self.cart)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        release_expired()
+        take_stock(self.unit.pk, 8)  # another shopper buys what was given back
+
+        with self.assertRaises(OutOfStock):
+            place_order(self.cart)
+        self.assert_nothing_ordered(stock=2)
+
+    def test_stale_hold_is_taken_afresh(self):
+        reserve_cart(self.cart)
+        add_to_db_cart(self.cart, self.unit.product, self.unit, 1)  # after checkout
+
+        place_order(self.cart)
+
+        self.assertEqual(self.stock(), 6)
+        self.assertFalse(StockReservation.objects.exists())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.calls = []
+
+        @idempotent("test")
+        def view(request):
+            self.calls.append(1)
+            return JsonResponse({"call": len(self.calls)})
+
+        self.view = view
+
+    def post(self, key, **data):
+        request = RequestFactory().post("/place/", {"idempotency_key": key, **data})
+        request.user = AnonymousUser()
+        return self.view(request)
+
+    def test_replay_returns_stored_response_without_running_view(self):
+        first = self.post("k1")
+        replay = self.post("k1")
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(replay.content, first.content)
+        self.assertEqual(replay["Idempotent-Replayed"], "true")
+
+    def test_key_reused_for_other_request_is_rejected(self):
+        self.post("k1", qty="1")
+        self.assertEqual(self.post("k1", qty="2").status_code, 422)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_request_in_progress_gets_409_at_once(self):
+        self.post("k1")
+        IdempotencyKey.objects.filter(key="k1").update(status_code=None)
+        self.assertEqual(self.post("k1").status_code, 409)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_retry_after_view_error_runs_again(self):
+        @idempotent("test")
+        def failing(request):
+            self.calls.append(1)
+            raise RuntimeError("boom")
+
+        request = RequestFactory().post("/place/", {"idempotency_key": "k1"})
+        request.user = AnonymousUser()
+        with self.assertRaises(RuntimeError):
+            failing(request)
+        self.assertFalse(IdempotencyKey.objects.filter(key="k1").exists())
+
+        self.assertEqual(self.post("k1").status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_abandoned_key_is_taken_over_after_its_lease(self):
+        # the first request's worker died before storing a response
+        self.post("k1")
+        IdempotencyKey.objects.filter(key="k1").update(
+            status_code=None, created_at=timezone.now() - timedelta(seconds=LEASE_SECONDS + 1)
+        )
+        response = self.post("k1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(IdempotencyKey.objects.get(key="k1").status_code, 200)
+        self.assertEqual(self.post("k1")["Idempotent-Replayed"], "true")
+
+    def test_key_given_back_during_race_gets_409(self):
+        # the concurrent claimant failed and deleted its row after our insert lost
+        with mock.patch.object(IdempotencyKey.objects, "create", side_effect=IntegrityError):
+            self.assertEqual(self.post("k1").status_code, 409)
+        self.assertEqual(self.calls, [])
+
+
+class CartBadgeTests(CatalogMixin, TestCase):
+    def setUp(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        shared_cache = override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": cache_dir.name,
+        }})
+        shared_cache.enable()
+        self.addCleanup(shared_cache.disable)
+
+        self.unit = self.make_unit()
+        self.user = get_user_model().objects.create(username="shopper")
+        self.cart = Cart.objects.create(user=self.user)
+
+    def badge(self):
+        request = RequestFactory().get("/")
+        request.user = self.user
+        return cart_count(request)["cart_count"]
+
+    def add(self, qty):
+        with self.captureOnCommitCallbacks(execute=True):
+            add_to_db_cart(self.cart, self.unit.product, self.unit, qty)
+
+    def test_warm_badge_costs_no_query(self):
+        self.add(2)
+        self.assertEqual(self.badge(), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.badge(), 2)
+
+    def test_badge_is_fresh_after_add(self):
+        self.assertEqual(self.badge(), 0)
+        self.add(3)
+        self.assertEqual(self.badge(), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.badge(), 3)
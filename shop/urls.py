@@ -6,12 +6,17 @@ app_name = "shop"
 
 urlpatterns = [
     path("", views.shop_index, name="shop_index"),
+    path("load-more/", views.shop_index_more, name="shop_index_more"),
+    path("search/", views.shop_search, name="shop_search"),
+    path("search/json/", views.shop_search_json, name="shop_search_json"),
     path("cart/", views.cart_view, name="cart_view"),
     path("cart/add/", views.add_to_cart, name="add_to_cart"),
     path("cart/remove/", views.remove_cart_item, name="remove_cart_item"),
+    path("cart/batch/", views.cart_batch, name="cart_batch"),
 
     # The missing one ↓↓↓
     path("checkout/", views.checkout_view, name="checkout_view"),
+    path("checkout/place/", views.place_order_view, name="place_order"),
     path("experience/book/", views.experience_booking_create, name="experience_booking_create"),
 
     path("<slug:slug>/", views.product_detail, name="product_detail"),
@@ -1,25 +1,48 @@
-from decimal import Decimal
+import json
+import uuid
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Count, Max, OuterRef, Subquery
 from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import urlencode
+
+from ochre.conditional import conditional_page
 
 from .models import (
     ShopItem,
-    ShopCategory,
+    ShopItemListing,
     Cart,
-    CartItem,
     ExperienceBooking,
     ProductUnit,
+    ShopItemRecommendation,
 )
+from .facets import selected_facets, apply_facets, facet_groups, facet_version
+from .fragment_cache import attach_fragment_versions, item_version
+from .listing import prefetch_detail, listing_page
+from .search import search_item_ids
+from .recommendations import recommended_listings
+from .pricing import PriceBook
+from .inventory import OutOfStock, reserve_cart
+from .orders import EmptyCart, Unavailable, drop_unavailable, place_order
+from .idempotency import idempotent
 from .cart_utils import (
+    add_to_db_cart,
+    remove_from_db_cart,
     add_to_session_cart,
     remove_from_session_cart,
-    session_cart_to_items,
+    price_session_cart,
     get_session_cart,
+    CartTooLarge,
+    CartOpError,
+    parse_cart_ops,
+    apply_ops_to_db_cart,
+    apply_ops_to_session_cart,
 )
 
 
@@ -34,35 +57,140 @@ def _is_ajax_request(request):
 # SHOP INDEX
 # ============================================================
 
-def shop_index(request):
-    category_slug = request.GET.get("category")
-    categories = ShopCategory.objects.all()
+def _listing_rows(request):
+    selected = selected_facets(request.GET)
+
+    # Cards come from the ShopItemListing snapshot: one indexed scan, no joins.
+    items = apply_facets(ShopItemListing.objects.all(), selected)
 
-    items = ShopItem.objects.filter(published=True).select_related("category")
-    if category_slug:
-        items = items.filter(category__slug=category_slug)
+    rows, next_cursor = listing_page(items, request.GET.get("cursor"))
+    return attach_fragment_versions(rows), next_cursor, selected
 
-    items = items.order_by("-created_at")
+
+def shop_index(request):
+    items, next_cursor, selected = _listing_rows(request)
 
     return render(
         request,
         "shop/shop_index.html",
         {
-            "categories": categories,
             "items": items,
-            "items_count": items.count(),
-            "active_category_slug": category_slug or "all",
+            "next_cursor": next_cursor,
+            # only built when the cached facet bar fragment misses
+            "facets": lambda: facet_groups(selected),
+            "facets_version": facet_version(),
+            "facet_query": urlencode(selected),
         },
     )
 
 
+def shop_index_more(request):
+    """
+    Next page of shop cards as JSON for the 'Show More' button / infinite
+    scroll. Cards are pre-rendered with the same include as the index.
+    """
+    items, next_cursor, _ = _listing_rows(request)
+
+    cards = [
+        render_to_string("shop/includes/item_card.html", {"item": item}, request=request)
+        for item in items
+    ]
+
+    return JsonResponse({
+        "html": "".join(cards),
+        "next_cursor": next_cursor,
+        "has_more": next_cursor is not None,
+    })
+
+
+# ============================================================
+# SEARCH
+# ============================================================
+
+def _search_rows(query):
+    ids = search_item_ids(query)
+    rows = ShopItemListing.objects.in_bulk(ids)
+    return attach_fragment_versions([rows[pk] for pk in ids if pk in rows])
+
+
+def shop_search(request):
+    query = request.GET.get("q", "").strip()
+    items = _search_rows(query) if query else []
+
+    return render(
+        request,
+        "shop/search.html",
+        {
+            "query": query,
+            "items": items,
+        },
+    )
+
+
+def shop_search_json(request):
+    query = request.GET.get("q", "").strip()
+
+    data = [
+        {
+            "id": row.item_id,
+            "title": row.title,
+            "slug": row.slug,
+            "url": reverse("shop:product_detail", args=[row.slug]),
+            "category": row.category_name,
+            "price": str(row.price) if row.price is not None else None,
+            "image": row.image_url,
+        }
+        for row in (_search_rows(query) if query else [])
+    ]
+
+    return JsonResponse({"query": query, "results": data})
+
+
 # ============================================================
 # PRODUCT DETAIL
 # ============================================================
 
+def _product_stamp(request, slug):
+    # the recommended cards are part of the page too: count them (an
+    # unpublished one drops out) and take the latest of their listing rows
+    recs = (
+        ShopItemRecommendation.objects.filter(item=OuterRef("pk"), related__listing__isnull=False)
+        .order_by()
+        .values("item")
+    )
+    row = (
+        ShopItem.objects.filter(slug=slug, published=True)
+        .annotate(
+            recs=Subquery(recs.annotate(n=Count("pk")).values("n")),
+            recs_updated=Subquery(recs.annotate(v=Max("related__listing__updated_at")).values("v")),
+        )
+        .values_list("pk", "updated_at", "recs", "recs_updated")
+        .first()
+    )
+    if not row:
+        return None
+    pk, updated_at, recs, recs_updated = row
+    return f"shop.item:{pk}:{recs or 0}", max(filter(None, (updated_at, recs_updated)))
+
+
+@conditional_page(_product_stamp)
 def product_detail(request, slug):
-    item = get_object_or_404(ShopItem, slug=slug, published=True)
-    return render(request, "shop/product_detail.html", {"item": item})
+    item = get_object_or_404(
+        ShopItem.objects.select_related("category"), slug=slug, published=True
+    )
+    return render(
+        request,
+        "shop/product_detail.html",
+        {
+            "item": item,
+            "item_version": item_version(item),
+            # units and gallery are only loaded when the page fragment misses
+            "detail_item": SimpleLazyObject(lambda: prefetch_detail(item)),
+            "recommendations": SimpleLazyObject(
+                lambda: attach_fragment_versions(list(recommended_listings(item.pk)))
+            ),
+        },
+    )
 
 
 # ============================================================
@@ -96,37 +224,19 @@ def add_to_cart(request):
 
     if request.user.is_authenticated:
         cart, _ = Cart.objects.get_or_create(user=request.user)
-
-        unit_price = (
-            product_unit.price
-            if product_unit
-            else (product.price or Decimal("0.00"))
-        )
-
-        ci, created = CartItem.objects.get_or_create(
-            cart=cart,
-            product=product,
-            product_unit=product_unit,
-            defaults={
-                "qty": qty,
-                "unit_price": unit_price,
-            },
-        )
-
-        if not created:
-            ci.qty += qty
-            ci.unit_price = unit_price
-            ci.save()
-
-        cart_count = cart.items_count()
+        summary = add_to_db_cart(cart, product, product_unit, qty)
+        cart_count = summary["item_count"]
 
     else:
-        add_to_session_cart(
-            request,
-            product.id,
-            qty,
-            product_unit_id=product_unit_id,
-        )
+        try:
+            add_to_session_cart(
+                request,
+                product.id,
+                qty,
+                product_unit_id=product_unit_id,
+            )
+        except CartTooLarge:
+            return HttpResponseBadRequest("Cart is full")
         session_cart = get_session_cart(request)
         cart_count = sum(int(v) for v in session_cart.values()) if session_cart else 0
 
@@ -158,12 +268,8 @@ def remove_cart_item(request):
     if request.user.is_authenticated:
         cart = getattr(request.user, "cart", None)
         if cart:
-            CartItem.objects.filter(
-                cart=cart,
-                product_id=product_id,
-                product_unit_id=product_unit_id,
-            ).delete()
-            cart_count = cart.items_count()
+            summary = remove_from_db_cart(cart, product_id, product_unit_id)
+            cart_count = summary["item_count"]
         else:
             cart_count = 0
     else:
@@ -177,45 +283,67 @@ def remove_cart_item(request):
     return redirect("shop:cart_view")
 
 
+# ============================================================
+# BATCH CART EDITS (JSON)
+# ============================================================
+
+@require_POST
+def cart_batch(request):
+    """
+    Apply several cart edits at once. Body:
+        {"ops": [{"op": "add" | "set_qty" | "remove",
+                  "product_id": 1, "product_unit_id": 2, "qty": 3}, ...]}
+    All ops apply or none do; the response carries the new cart summary.
+    """
+    try:
+        ops = parse_cart_ops(json.loads(request.body or b"{}").get("ops"))
+    except (ValueError, AttributeError) as exc:
+        message = str(exc) if isinstance(exc, CartOpError) else "Invalid JSON body"
+        return JsonResponse({"ok": False, "error": message}, status=400)
+
+    try:
+        if request.user.is_authenticated:
+            cart, _ = Cart.objects.get_or_create(user=request.user)
+            summary = apply_ops_to_db_cart(cart, ops)
+        else:
+            summary = apply_ops_to_session_cart(request, ops)
+    except (CartOpError, CartTooLarge) as exc:
+        return JsonResponse({"ok": False, "error": str(exc)}, status=400)
+
+    return JsonResponse({
+        "ok": True,
+        "cart_count": summary["item_count"],
+        "subtotal": str(summary["subtotal"]),
+        "tax_total": str(summary["tax_total"]),
+        "total": str(summary["total"]),
+    })
+
+
 # ============================================================
 # CART PAGE
 # ============================================================
 
 def cart_view(request):
-    items = []
-    subtotal = Decimal("0.00")
+    priced = None
 
     if request.user.is_authenticated:
         cart = getattr(request.user, "cart", None)
         if cart:
-            for ci in cart.items.select_related("product", "product_unit"):
-                line_total = ci.line_total()
-                items.append(
-                    {
-                        "product": ci.product,
-                        "product_unit": ci.product_unit,
-                        "qty": ci.qty,
-                        "unit_price": ci.unit_price,
-                        "line_total": line_total,
-                    }
-                )
-                subtotal += line_total
+            priced = cart.priced()
     else:
-        for row in session_cart_to_items(request):
-            items.append(row)
-            subtotal += row["line_total"]
+        priced = price_session_cart(request)
 
-    gst = (subtotal * Decimal("0.18")).quantize(Decimal("0.01"))
-    grand_total = subtotal + gst
+    if priced is None:
+        priced = PriceBook({}).price([])
 
     return render(
         request,
         "shop/cart.html",
         {
-            "items": items,
-            "subtotal": subtotal,
-            "gst": gst,
-            "grand_total": grand_total,
+            "items": priced["lines"],
+            "subtotal": priced["subtotal"],
+            "gst": priced["tax_total"],
+            "grand_total": priced["total"],
         },
     )
 
@@ -230,24 +358,70 @@ def checkout_view(request):
     if not cart or not cart.items.exists():
         return redirect("shop:shop_index")
 
+    gone = drop_unavailable(cart)
+    if gone:
+        messages.warning(request, f"{Unavailable(gone)} (removed from your cart).")
+        if not cart.items.exists():
+            return redirect("shop:cart_view")
+
+    try:
+        reserved_until = reserve_cart(cart)
+    except OutOfStock as exc:
+        messages.error(request, str(exc))
+        return redirect("shop:cart_view")
+
+    priced = cart.priced()
+
     return render(
         request,
         "shop/checkout.html",
         {
             "cart": cart,
-            "items": cart.items.select_related("product"),
-            "subtotal": cart.subtotal(),
-            "tax_total": cart.total_tax(),
-            "total": cart.total(),
+            "items": priced["lines"],
+            "subtotal": priced["subtotal"],
+            "tax_total": priced["tax_total"],
+            "total": priced["total"],
+            "reserved_until": reserved_until,
+            "idempotency_key": uuid.uuid4().hex,
         },
     )
 
 
+@login_required(login_url="account_login")
+@require_POST
+@idempotent("place_order")
+def place_order_view(request):
+    cart = getattr(request.user, "cart", None)
+    try:
+        if cart is None:
+            raise EmptyCart("Your cart is empty.")
+        order = place_order(cart, request.user)
+    except (EmptyCart, Unavailable, OutOfStock) as exc:
+        if _is_ajax_request(request):
+            return JsonResponse({"ok": False, "error": str(exc)}, status=409)
+        messages.error(request, str(exc))
+        # the checkout page clears out lines that are no longer for sale
+        return redirect("shop:checkout_view" if isinstance(exc, Unavailable) else "shop:cart_view")
+
+    if _is_ajax_request(request):
+        return JsonResponse({
+            "ok": True,
+            "order_id": order.pk,
+            "subtotal": str(order.subtotal),
+            "tax_total": str(order.tax_total),
+            "total": str(order.total),
+        })
+
+    messages.success(request, f"Thank you! {order} has been placed.")
+    return redirect("shop:shop_index")
+
+
 # ============================================================
 # EXPERIENCE BOOKING
 # ============================================================
 
 @require_POST
+@idempotent("experience_booking")
 def experience_booking_create(request):
     experience_id = request.POST.get("experience_id")
     customer_name = request.POST.get("customer_name")